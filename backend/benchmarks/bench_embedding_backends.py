@@ -0,0 +1,91 @@
+"""Compare the torch, ONNX and int8 ONNX embedding backends on CPU.
+
+Reports per-query latency (single text, as in ``/api/v1/add_case``),
+batch throughput, and how closely each backend agrees with the PyTorch
+vectors: mean cosine similarity and top-k overlap when retrieving chunks
+of the ingested collection.
+
+    python benchmarks/bench_embedding_backends.py --queries 200 --k 10
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+# parseCases uses the flat imports of the database/ scripts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+from embedding_backend import BACKENDS, load_embedding_model
+from parseCases import MODEL_NAME, get_collection
+
+
+def load_texts(n_corpus: int, n_queries: int):
+    """Corpus chunks from the collection; queries are sentences cut from other chunks."""
+    documents = get_collection().get(limit=n_corpus + n_queries, include=["documents"])["documents"]
+    if len(documents) < n_queries + 1:
+        raise SystemExit("❌ Not enough chunks in the collection; run parseCases.py first")
+    corpus, rest = documents[:n_corpus], documents[n_corpus:] or documents
+    queries = [" ".join(doc.split()[:40]) for doc in rest[:n_queries]]
+    return corpus, queries
+
+
+def time_single(model, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def time_batch(model, texts, batch_size):
+    start = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    return len(texts) / (time.perf_counter() - start), vectors
+
+
+def top_k(query_vectors, corpus_vectors, k):
+    scores = query_vectors @ corpus_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--corpus", type=int, default=2000, help="Chunks embedded for throughput/retrieval")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    corpus, queries = load_texts(args.corpus, args.queries)
+    print(f"📊 {len(corpus)} corpus chunks, {len(queries)} queries, k={args.k}")
+
+    results = {}
+    for backend in args.backends:
+        print(f"🔄 {backend}")
+        model = load_embedding_model(MODEL_NAME, backend, args.threads)
+        model.encode(queries[:8])  # warm-up
+        p50, p99 = time_single(model, queries)
+        throughput, corpus_vectors = time_batch(model, corpus, args.batch_size)
+        query_vectors = model.encode(queries, batch_size=args.batch_size, normalize_embeddings=True)
+        results[backend] = (p50, p99, throughput, corpus_vectors, query_vectors)
+
+    reference = results.get("torch")
+    print(f"\n{'backend':<10} {'p50 ms':>8} {'p99 ms':>8} {'chunks/s':>9} {'cos vs torch':>13} {'overlap@k':>10}")
+    for backend, (p50, p99, throughput, corpus_vectors, query_vectors) in results.items():
+        cosine = overlap = float("nan")
+        if reference is not None:
+            cosine = float(np.mean(np.sum(corpus_vectors * reference[3], axis=1)))
+            k = min(args.k, len(corpus))
+            ours = top_k(query_vectors, corpus_vectors, k)
+            theirs = top_k(reference[4], reference[3], k)
+            overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ours, theirs)]))
+        print(f"{backend:<10} {p50:>8.2f} {p99:>8.2f} {throughput:>9.1f} {cosine:>13.4f} {overlap:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
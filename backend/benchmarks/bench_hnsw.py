@@ -0,0 +1,133 @@
+"""Recall/latency sweep over Chroma HNSW settings.
+
+Copies the chunk vectors of the ingested collection into scratch in-memory
+collections, one per combination of ``--space``, ``--m``,
+``--construction-ef`` and ``--search-ef`` (Chroma fixes ``search_ef`` when a
+collection is created, so every value gets a freshly built collection rather
+than a modified one), replays a query set against each
+and reports build time, p50/p99 query latency and recall@k. Recall is
+measured against an exact brute-force search over the same vectors in the
+same space. The live collection is measured too, with the settings it was
+created with.
+
+Queries are the prompts in ``--queries-file`` (one per line, embedded with
+the service's model), or chunk vectors sampled from the collection.
+
+    python benchmarks/bench_hnsw.py --queries-file prompts.txt --k 150 \\
+        --m 16 32 --search-ef 10 50 200
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import itertools
+
+import chromadb
+import numpy as np
+
+# parseCases uses the flat imports of the database/ scripts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'database'))
+
+from collection_settings import hnsw_metadata
+from embedding_backend import BACKENDS, EMBEDDING_BACKEND, load_embedding_model
+from parseCases import ADD_BATCH_SIZE, MODEL_NAME, get_collection
+
+
+def load_corpus(collection, limit: int = None):
+    ids, blocks = [], []
+    total = min(collection.count(), limit or collection.count())
+    for offset in range(0, total, ADD_BATCH_SIZE):
+        page = collection.get(limit=min(ADD_BATCH_SIZE, total - offset), offset=offset, include=["embeddings"])
+        ids.extend(page["ids"])
+        blocks.append(np.asarray(page["embeddings"], dtype=np.float32))
+    if not ids:
+        raise SystemExit("❌ The collection is empty; run parseCases.py first")
+    return ids, np.concatenate(blocks)
+
+
+def load_queries(args, vectors: np.ndarray) -> np.ndarray:
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as f:
+            prompts = [line.strip() for line in f if line.strip()][:args.queries]
+        model = load_embedding_model(MODEL_NAME, args.embedding_backend)
+        return np.asarray(model.encode(prompts, normalize_embeddings=True), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    return vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+
+
+def exact_top_k(queries: np.ndarray, vectors: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Brute-force neighbours in Chroma's distance for ``space``."""
+    if space == "l2":
+        distances = np.sum(vectors ** 2, axis=1)[None, :] - 2 * queries @ vectors.T
+    elif space == "cosine":
+        unit = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        distances = -(queries @ unit.T)
+    else:
+        distances = -(queries @ vectors.T)
+    return np.argpartition(distances, k - 1, axis=1)[:, :k]
+
+
+def measure(collection, queries: np.ndarray, k: int, id_rows: dict):
+    """p50/p99 latency in ms and the result rows of every query."""
+    latencies, rows = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append((time.perf_counter() - start) * 1000)
+        rows.append([id_rows[i] for i in result["ids"][0]])
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), rows
+
+
+def recall(rows, exact: np.ndarray, k: int) -> float:
+    return float(np.mean([len(set(found) & set(truth)) / k for found, truth in zip(rows, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries-file", help="Prompts to replay, one per line")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=150, help="Results per query (search_similar_cases asks for top_k * pool factor)")
+    parser.add_argument("--corpus", type=int, default=None, help="Only copy the first N chunks")
+    parser.add_argument("--space", nargs="+", default=["l2"], choices=["l2", "cosine", "ip"])
+    parser.add_argument("--m", nargs="+", type=int, default=[16])
+    parser.add_argument("--construction-ef", nargs="+", type=int, default=[100])
+    parser.add_argument("--search-ef", nargs="+", type=int, default=[10, 50, 100, 200])
+    parser.add_argument("--embedding-backend", choices=BACKENDS, default=EMBEDDING_BACKEND)
+    args = parser.parse_args()
+
+    live = get_collection()
+    ids, vectors = load_corpus(live, args.corpus)
+    id_rows = {chunk_id: row for row, chunk_id in enumerate(ids)}
+    queries = load_queries(args, vectors)
+    k = min(args.k, len(ids))
+    print(f"📊 {len(ids)} chunks, {len(queries)} queries, k={k}")
+
+    exact = {}
+    print(f"\n{'index':<34} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'recall@k':>9}")
+    if args.corpus is None:
+        live_space = (live.metadata or {}).get("hnsw:space", "l2")
+        exact[live_space] = exact_top_k(queries, vectors, k, live_space)
+        p50, p99, rows = measure(live, queries, k, id_rows)
+        print(f"{'live collection':<34} {'-':>8} {p50:>8.2f} {p99:>8.2f} {recall(rows, exact[live_space], k):>9.3f}")
+
+    client = chromadb.EphemeralClient()
+    for space, m, construction_ef, search_ef in itertools.product(args.space, args.m, args.construction_ef, args.search_ef):
+        if space not in exact:
+            exact[space] = exact_top_k(queries, vectors, k, space)
+        name = f"bench-{uuid.uuid4().hex[:8]}"
+        # A new collection per search_ef too: modify() would not reach the HNSW segment
+        collection = client.create_collection(name, metadata=hnsw_metadata(space, m, construction_ef, search_ef))
+        start = time.perf_counter()
+        for offset in range(0, len(ids), ADD_BATCH_SIZE):
+            collection.add(ids=ids[offset:offset + ADD_BATCH_SIZE],
+                           embeddings=vectors[offset:offset + ADD_BATCH_SIZE].tolist())
+        build_seconds = time.perf_counter() - start
+        p50, p99, rows = measure(collection, queries, k, id_rows)
+        label = f"{space} M={m} cef={construction_ef} ef={search_ef}"
+        print(f"{label:<34} {build_seconds:>8.1f} {p50:>8.2f} {p99:>8.2f} {recall(rows, exact[space], k):>9.3f}")
+        client.delete_collection(name)
+
+
+if __name__ == "__main__":
+    main()
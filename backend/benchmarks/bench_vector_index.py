@@ -0,0 +1,92 @@
+"""Compare the Chroma (HNSW), NumPy (exact) and compressed two-stage vector index backends.
+
+Queries are chunk vectors taken from the ingested collection itself, so no
+embedding model is needed. Reports single-query p50/p99 latency, batched
+throughput, the vector data held in RAM and the recall@k of each backend
+against the exact NumPy result.
+
+    python benchmarks/bench_vector_index.py --queries 200 --k 100
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+# parseCases uses the flat imports of the database/ scripts
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'database'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from parseCases import MANIFEST_PATH, get_collection
+from services.vector_index import PCA_DIMS, RERANK_FACTOR, ChromaIndex, CompressedIndex, NumpyIndex
+
+
+def load_queries(collection, n_queries: int) -> np.ndarray:
+    embeddings = collection.get(limit=n_queries, include=["embeddings"])["embeddings"]
+    if not embeddings:
+        raise SystemExit("❌ The collection is empty; run parseCases.py first")
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def time_single(index, queries, k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.query([query], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def time_batch(index, queries, k, batch_size):
+    start = time.perf_counter()
+    ids = []
+    for offset in range(0, len(queries), batch_size):
+        ids.extend(index.query(queries[offset:offset + batch_size], k)["ids"])
+    return len(queries) / (time.perf_counter() - start), ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=100, help="Results per query (search_similar_cases asks for top_k * 10)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--no-mmap", action="store_true", help="Read the NumPy snapshot into RAM instead of mapping it")
+    parser.add_argument("--pca-dims", type=int, default=PCA_DIMS, help="Dimensions kept by the numpy-pca first stage")
+    parser.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR,
+                        help="First-stage candidates per result for the compressed indexes")
+    args = parser.parse_args()
+
+    collection = get_collection()
+    queries = load_queries(collection, args.queries)
+    k = min(args.k, collection.count())
+    print(f"📊 {collection.count()} chunks, {len(queries)} queries, k={k}")
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        start = time.perf_counter()
+        numpy_index = NumpyIndex(collection, snapshot_dir, MANIFEST_PATH, mmap=not args.no_mmap)
+        print(f"🔄 NumPy snapshot built and loaded in {time.perf_counter() - start:.2f}s")
+        indexes = {"chroma": ChromaIndex(collection), "numpy": numpy_index}
+        for compression in ("int8", "pca"):
+            # Reuses the snapshot written above
+            indexes[f"numpy-{compression}"] = CompressedIndex(collection, snapshot_dir, MANIFEST_PATH, compression,
+                                                              args.pca_dims, args.rerank_factor)
+
+        results = {}
+        for name, index in indexes.items():
+            index.query(queries[:8], k)  # warm-up
+            p50, p99 = time_single(index, queries, k)
+            throughput, ids = time_batch(index, queries, k, args.batch_size)
+            ram = f"{index.resident_bytes() / 2 ** 20:.1f}" if hasattr(index, "resident_bytes") else "-"
+            results[name] = (p50, p99, throughput, ram, ids)
+
+    exact = results["numpy"][4]
+    print(f"\n{'index':<11} {'p50 ms':>8} {'p99 ms':>8} {'queries/s':>10} {'RAM MB':>8} {'recall@k':>9}")
+    for name, (p50, p99, throughput, ram, ids) in results.items():
+        recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ids, exact)]))
+        print(f"{name:<11} {p50:>8.2f} {p99:>8.2f} {throughput:>10.1f} {ram:>8} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from database.case_reader import read_case_header
+from database.ingest_manifest import file_fingerprint
+from database.text_repair import repair_value
+
+# === Configuration ===
+CASE_FILE_CACHE_SIZE = int(os.environ.get("CASE_FILE_CACHE_SIZE", "512"))
+
+
+class CaseFileCache:
+    """Bounded LRU of case file headers, keyed by file name.
+
+    Holds what ``read_case_header`` returns: the top-level case fields plus
+    the title, type and date of each decision, never the decision texts.
+    An entry is re-validated on every hit: a matching size/mtime fingerprint
+    serves it directly, otherwise the file is re-read and its content hash
+    decides whether the cached header is still current.
+
+    Returned dicts are shared between callers and must not be mutated.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, cases_dir: str, max_entries: int = CASE_FILE_CACHE_SIZE):
+        self.cases_dir = cases_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, source_file: str) -> Optional[dict]:
+        """Return the header of ``source_file``, or None if the file does not exist."""
+        path = os.path.join(self.cases_dir, source_file)
+        try:
+            fingerprint = file_fingerprint(path)
+        except OSError:
+            with self._lock:
+                self._entries.pop(source_file, None)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(source_file)
+            if entry is not None and entry["fingerprint"] == fingerprint:
+                self.hits += 1
+                self._entries.move_to_end(source_file)
+                return entry["header"]
+
+        digest = hashlib.sha256()
+        # Repaired once per load, like the chunks at ingest
+        header = repair_value(read_case_header(path, digest=digest))
+        with self._lock:
+            if entry is not None and entry["sha256"] == digest.hexdigest():
+                # Touched but not changed: keep the object callers already hold
+                self.hits += 1
+                header = entry["header"]
+            else:
+                self.misses += 1
+            self._entries[source_file] = {"fingerprint": fingerprint, "sha256": digest.hexdigest(), "header": header}
+            self._entries.move_to_end(source_file)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return header
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
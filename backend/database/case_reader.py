@@ -0,0 +1,84 @@
+"""Streaming readers for case JSON files.
+
+Case files can hold several awards, each with its full text under
+``Decisions[*].Content``. ``json.load`` materialises all of it at once;
+these helpers walk the file with ``ijson`` instead, so memory stays bounded
+by the largest single decision rather than the whole file.
+"""
+from typing import Iterator, Tuple
+
+import ijson
+
+SCALAR_EVENTS = ("null", "boolean", "integer", "double", "number", "string")
+# Decision fields kept by read_case_header; everything else (Content) is skipped
+DECISION_SUMMARY_FIELDS = ("Title", "Type", "Date")
+
+
+class _HashingReader:
+    """File wrapper that feeds every byte read into a hashlib digest."""
+
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+def read_case_header(file_path: str, decision_fields: Tuple[str, ...] = DECISION_SUMMARY_FIELDS,
+                     digest=None) -> dict:
+    """Read every top-level field of a case file except the decision texts.
+
+    ``Decisions`` is returned as a list of dicts holding only
+    ``decision_fields``. If ``digest`` (a hashlib object) is given, the raw
+    file bytes are fed into it along the way.
+    """
+    header = {}
+    decisions = []
+    key = None
+    builder = None
+
+    with open(file_path, "rb") as f:
+        source = _HashingReader(f, digest) if digest is not None else f
+        for prefix, event, value in ijson.parse(source, use_float=True):
+            if prefix == "" and event == "map_key":
+                key = value
+                builder = None if key == "Decisions" else ijson.ObjectBuilder()
+                continue
+            if key is None or prefix == "":
+                continue
+
+            if key == "Decisions":
+                if prefix == "Decisions.item" and event == "start_map":
+                    decisions.append({})
+                elif prefix.startswith("Decisions.item.") and event in SCALAR_EVENTS:
+                    field = prefix[len("Decisions.item."):]
+                    if field in decision_fields:
+                        decisions[-1][field] = value
+                continue
+
+            builder.event(event, value)
+            # The value is complete once we are back at the key's own prefix
+            if prefix == key and (event in SCALAR_EVENTS or event in ("end_map", "end_array")):
+                header[key] = builder.value
+                key = None
+
+    header["Decisions"] = decisions
+    return header
+
+
+def iter_decisions(file_path: str) -> Iterator[dict]:
+    """Yield the entries of ``Decisions`` one at a time, content included."""
+    with open(file_path, "rb") as f:
+        yield from ijson.items(f, "Decisions.item", use_float=True)
+
+
+def read_case_file(file_path: str, digest=None) -> Tuple[dict, Iterator[dict]]:
+    """Return ``(header, decisions)`` for streaming ingestion of a case file.
+
+    The header comes from a first pass that skips decision texts; the
+    decisions iterator makes a second pass and yields full decisions lazily.
+    """
+    return read_case_header(file_path, digest=digest), iter_decisions(file_path)
@@ -0,0 +1,61 @@
+import sqlite3
+import json
+import os
+from typing import Dict, Iterable, List, Tuple
+
+
+class CaseTable:
+    """Case-level metadata keyed by case ``Identifier``.
+
+    Chunk records in Chroma only carry a ``case_key`` plus decision fields;
+    the title, parties, treaties etc. of a case are stored once here and
+    joined back in after retrieval.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.create_tables()
+
+    def create_tables(self):
+        """Create the necessary tables if they don't exist."""
+        cursor = self.conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cases (
+            case_key TEXT PRIMARY KEY,
+            source_file TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS cases_source_file ON cases (source_file)')
+        self.conn.commit()
+
+    def upsert_many(self, rows: Iterable[Tuple[str, str, dict]]) -> None:
+        """Insert or replace ``(case_key, source_file, metadata)`` rows."""
+        cursor = self.conn.cursor()
+        cursor.executemany(
+            'INSERT OR REPLACE INTO cases (case_key, source_file, metadata) VALUES (?, ?, ?)',
+            [(key, source_file, json.dumps(metadata)) for key, source_file, metadata in rows]
+        )
+        self.conn.commit()
+
+    def delete_source_files(self, source_files: Iterable[str]) -> None:
+        cursor = self.conn.cursor()
+        cursor.executemany('DELETE FROM cases WHERE source_file = ?', [(f,) for f in source_files])
+        self.conn.commit()
+
+    def load_all(self) -> Dict[str, dict]:
+        """Return every case's metadata keyed by ``case_key``."""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT case_key, metadata FROM cases')
+        return {key: json.loads(metadata) for key, metadata in cursor.fetchall()}
+
+    def load_rows(self) -> List[Tuple[str, str, dict]]:
+        """Return every ``(case_key, source_file, metadata)`` row."""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT case_key, source_file, metadata FROM cases')
+        return [(key, source_file, json.loads(metadata)) for key, source_file, metadata in cursor.fetchall()]
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,41 @@
+"""HNSW settings of the Chroma collection, from the environment.
+
+``HNSW_SPACE``, ``HNSW_M`` and ``HNSW_CONSTRUCTION_EF`` shape the graph;
+``HNSW_SEARCH_EF`` trades recall for query latency. All of them only take
+effect when the collection is created: Chroma copies them into the HNSW
+segment once, and later metadata changes never reach it. Rebuild the
+collection to change any of them. Unset values keep Chroma's defaults.
+"""
+import os
+
+HNSW_SPACE = os.environ.get("HNSW_SPACE")                    # l2 | cosine | ip
+HNSW_M = os.environ.get("HNSW_M")
+HNSW_CONSTRUCTION_EF = os.environ.get("HNSW_CONSTRUCTION_EF")
+HNSW_SEARCH_EF = os.environ.get("HNSW_SEARCH_EF")
+
+
+def hnsw_metadata(space=HNSW_SPACE, m=HNSW_M, construction_ef=HNSW_CONSTRUCTION_EF,
+                  search_ef=HNSW_SEARCH_EF) -> dict:
+    """Collection metadata for the given HNSW settings; None leaves a setting at its default."""
+    metadata = {}
+    if space:
+        metadata["hnsw:space"] = space
+    if m:
+        metadata["hnsw:M"] = int(m)
+    if construction_ef:
+        metadata["hnsw:construction_ef"] = int(construction_ef)
+    if search_ef:
+        metadata["hnsw:search_ef"] = int(search_ef)
+    return metadata
+
+
+def open_collection(client, name: str, create_metadata: dict = None):
+    """Get ``name``, creating it with the configured HNSW settings if it does not exist.
+
+    An existing collection keeps the settings it was created with. Chroma's
+    ``get_or_create_collection`` is avoided on purpose, as it would overwrite
+    the metadata of an existing collection.
+    """
+    if name not in [c.name for c in client.list_collections()]:
+        return client.create_collection(name=name, metadata={**hnsw_metadata(), **(create_metadata or {})})
+    return client.get_collection(name)
@@ -0,0 +1,151 @@
+"""Pluggable embedding backends behind the SentenceTransformer ``encode`` interface.
+
+- ``torch``: the regular PyTorch ``SentenceTransformer``
+- ``onnx``: the same transformer exported to ONNX and run with ONNX Runtime
+- ``onnx-int8``: the ONNX export with dynamic int8 quantization of the weights
+
+The ONNX variants are exported on first use into ``ONNX_MODEL_DIR``. All
+backends expose ``encode``, ``tokenizer`` and ``max_seq_length``, so callers
+(ingestion, chunking, ``EmbeddingService``) do not care which one they get.
+"""
+import os
+import json
+from typing import List, Optional, Union
+
+import numpy as np
+
+# === Configuration ===
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+ONNX_MODEL_DIR = os.environ.get(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(__file__), 'onnx_models')
+)
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def backend_cache_name(model_name: str, backend: str = EMBEDDING_BACKEND) -> str:
+    """Name under which a backend's vectors are cached; quantized vectors differ slightly."""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def _onnx_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+
+def export_onnx(model_name: str, quantize: bool = True) -> str:
+    """Export ``model_name``'s transformer to ONNX (plus an int8 copy). Returns the output directory."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = _onnx_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+
+    dummy = st_model.tokenizer(["export"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(dummy[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+
+    with open(os.path.join(out_dir, "config.json"), "w") as f:
+        json.dump({"model_name": model_name, "max_seq_length": st_model.max_seq_length}, f)
+    return out_dir
+
+
+class OnnxEmbedder:
+    """Mean-pooled sentence embeddings from an ONNX Runtime session.
+
+    Mirrors the ``Transformer -> mean Pooling -> Normalize`` pipeline of
+    all-MiniLM-style SentenceTransformers.
+    """
+
+    def __init__(self, model_name: str, quantized: bool = False, threads: Optional[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = _onnx_dir(model_name)
+        model_file = "model_int8.onnx" if quantized else "model.onnx"
+        if not os.path.exists(os.path.join(model_dir, model_file)):
+            print(f"🔄 Exporting {model_name} to ONNX in {model_dir}")
+            export_onnx(model_name, quantize=True)
+        with open(os.path.join(model_dir, "config.json")) as f:
+            config = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_seq_length = config["max_seq_length"]
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               normalize_embeddings: bool = False, convert_to_numpy: bool = True) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Length-sorted batches keep padding (and wasted compute) down
+        order = np.argsort([-len(s) for s in sentences], kind="stable")
+        pooled_batches = []
+        for start in range(0, len(sentences), batch_size):
+            encoded = self.tokenizer(
+                [sentences[i] for i in order[start:start + batch_size]],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self._input_names}
+            hidden = self.session.run(None, feed)[0]
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            pooled_batches.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        if not pooled_batches:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        embeddings = np.empty((len(sentences), pooled_batches[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(pooled_batches)
+
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+def load_embedding_model(model_name: str, backend: str = EMBEDDING_BACKEND, threads: Optional[int] = None):
+    """Return an object with a SentenceTransformer-compatible ``encode`` for ``backend``."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbedder(model_name, quantized=backend == "onnx-int8", threads=threads)
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export an embedding model to ONNX (fp32 and int8).")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    args = parser.parse_args()
+    print(f"✅ Exported to {export_onnx(args.model)}")
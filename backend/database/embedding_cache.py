@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+# === Configuration ===
+# Lives outside chroma_data on purpose: wiping the vector store for a rebuild
+# must not throw away the embeddings we already paid for.
+CACHE_DIR = os.environ.get(
+    "EMBEDDING_CACHE_DIR",
+    os.path.join(os.path.dirname(__file__), 'embedding_cache')
+)
+CACHE_DTYPE = os.environ.get("EMBEDDING_CACHE_DTYPE", "float16")
+KEY_BYTES = 16
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Append-only on-disk map from (model name, text hash) to an embedding.
+
+    Each model gets its own directory holding two parallel files:
+
+    - ``keys.bin``: one 16-byte blake2b digest of the text per row
+    - ``vectors.bin``: the row-major embedding matrix (float16 by default),
+      memory-mapped for reads
+
+    The hash index is rebuilt in memory from ``keys.bin`` when the cache is
+    opened. Only one process should write to a cache at a time; readers pick
+    up rows appended by the writer on their next miss. Lookups may run on
+    several threads: a sync publishes the grown matrix before the keys that
+    point into it.
+    """
+
+    def __init__(self, model_name: str, root: str = CACHE_DIR, dtype: str = CACHE_DTYPE,
+                 writable: bool = True):
+        self.model_name = model_name
+        self.dir = os.path.join(root, model_name.replace("/", "__"))
+        self.writable = writable
+        self.hits = 0
+        self.misses = 0
+
+        self._keys_path = os.path.join(self.dir, "keys.bin")
+        self._vectors_path = os.path.join(self.dir, "vectors.bin")
+        self._meta_path = os.path.join(self.dir, "meta.json")
+        self._index: Dict[bytes, int] = {}
+        self._rows = 0
+        self._vectors = None
+        self._sync_lock = threading.Lock()
+
+        self.dim = None
+        self.dtype = np.dtype(dtype)
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+            self.dim = meta["dim"]
+            self.dtype = np.dtype(meta["dtype"])
+        if writable:
+            self._truncate_partial_rows()
+        self._sync()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def _truncate_partial_rows(self):
+        """Cut both files back to their shared whole rows.
+
+        A writer that crashed between the two appends leaves an unpaired row
+        behind; appending after it would pair every later key with the
+        vector written before its own.
+        """
+        if self.dim is None or not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return
+        row_bytes = self.dim * self.dtype.itemsize
+        rows = min(os.path.getsize(self._keys_path) // KEY_BYTES,
+                   os.path.getsize(self._vectors_path) // row_bytes)
+        for path, size in ((self._keys_path, rows * KEY_BYTES), (self._vectors_path, rows * row_bytes)):
+            if os.path.getsize(path) != size:
+                os.truncate(path, size)
+
+    def _sync(self) -> bool:
+        """Pick up rows appended since the last sync. Returns True if any were."""
+        if self.dim is None or not os.path.exists(self._keys_path) or not os.path.exists(self._vectors_path):
+            return False
+        row_bytes = self.dim * self.dtype.itemsize
+        with self._sync_lock:
+            # A writer may have crashed between the two appends; trust the shorter file
+            rows = min(os.path.getsize(self._keys_path) // KEY_BYTES,
+                       os.path.getsize(self._vectors_path) // row_bytes)
+            if rows <= self._rows:
+                return False
+
+            with open(self._keys_path, "rb") as f:
+                f.seek(self._rows * KEY_BYTES)
+                data = f.read((rows - self._rows) * KEY_BYTES)
+            # Matrix first, so a key another thread finds always has its row mapped
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            for i in range(rows - self._rows):
+                self._index.setdefault(data[i * KEY_BYTES:(i + 1) * KEY_BYTES], self._rows + i)
+            self._rows = rows
+            return True
+
+    def lookup(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached float32 vector for each text, or None on a miss."""
+        keys = [text_key(t) for t in texts]
+        if any(k not in self._index for k in keys):
+            self._sync()
+
+        found = []
+        for key in keys:
+            row = self._index.get(key)
+            if row is None:
+                self.misses += 1
+                found.append(None)
+            else:
+                self.hits += 1
+                found.append(np.asarray(self._vectors[row], dtype=np.float32))
+        return found
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        return self.lookup([text])[0]
+
+    def put_many(self, texts: List[str], vectors) -> int:
+        """Append vectors for texts not cached yet. Returns the number added."""
+        if not self.writable:
+            raise RuntimeError("Embedding cache was opened read-only")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dim is None:
+            os.makedirs(self.dir, exist_ok=True)
+            self.dim = int(vectors.shape[1])
+            with open(self._meta_path, "w") as f:
+                json.dump({"model": self.model_name, "dim": self.dim, "dtype": self.dtype.name}, f)
+        # Also covers an append of this instance that failed half-way
+        self._truncate_partial_rows()
+        self._sync()
+
+        new_keys, new_rows, seen = [], [], set()
+        for text, vector in zip(texts, vectors):
+            key = text_key(text)
+            if key in self._index or key in seen:
+                continue
+            seen.add(key)
+            new_keys.append(key)
+            new_rows.append(vector)
+        if not new_keys:
+            return 0
+
+        # Vectors first: a crash in between leaves an orphan row, never a key
+        # pointing past the end of the matrix; the next writer truncates it
+        with open(self._vectors_path, "ab") as f:
+            f.write(np.asarray(new_rows, dtype=self.dtype).tobytes())
+        with open(self._keys_path, "ab") as f:
+            f.write(b"".join(new_keys))
+        self._sync()
+        return len(new_keys)
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray],
+               store: bool = True) -> np.ndarray:
+        """Embed ``texts``, only calling ``encode_fn`` for the cache misses."""
+        cached = self.lookup(texts)
+        # Each distinct missed text is encoded once, however often it repeats
+        missing = {}
+        for i, vector in enumerate(cached):
+            if vector is None:
+                missing.setdefault(texts[i], []).append(i)
+        if missing:
+            unique = list(missing)
+            fresh = np.asarray(encode_fn(unique), dtype=np.float32)
+            for text, vector in zip(unique, fresh):
+                for i in missing[text]:
+                    cached[i] = vector
+            if store and self.writable:
+                self.put_many(unique, fresh)
+        if not cached:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return np.stack(cached)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "rows": self._rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional
+
+
+def sha256_hex(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path: str) -> dict:
+    """Cheap change detector: size and mtime, checked before hashing the file."""
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class IngestManifest:
+    """Records which case files and decisions are already in the collection.
+
+    Layout of the JSON file::
+
+        {"collection": "legal_cases",
+         "files": {"case1.json": {"sha256": ..., "size": ..., "mtime_ns": ...,
+                                  "decisions": {"0": {"hash": ..., "chunk_ids": [...]}}}}}
+    """
+
+    def __init__(self, path: str, collection_name: str, settings: str = ""):
+        self.path = path
+        self.collection_name = collection_name
+        # Chunking settings the recorded files were ingested with; when they
+        # change every file has to be re-chunked even if its bytes did not
+        self.settings = settings
+        self.settings_changed = False
+        self.files: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # A manifest written for another collection says nothing about this one
+            if data.get("collection") == collection_name:
+                self.files = data.get("files", {})
+                self.settings_changed = bool(self.files) and data.get("settings") != settings
+
+    def get(self, source_file: str) -> Optional[dict]:
+        return self.files.get(source_file)
+
+    def is_unchanged(self, source_file: str, file_path: str) -> bool:
+        """True if ``file_path`` matches what was ingested last time.
+
+        The size/mtime fingerprint short-circuits the common case; when it
+        differs the content hash decides, so a ``touch`` does not trigger a
+        re-embed.
+        """
+        entry = self.files.get(source_file)
+        if entry is None or self.settings_changed:
+            return False
+        fingerprint = file_fingerprint(file_path)
+        if all(entry.get(k) == v for k, v in fingerprint.items()):
+            return True
+        if entry.get("sha256") == file_sha256(file_path):
+            entry.update(fingerprint)
+            return True
+        return False
+
+    def update(self, source_file: str, entry: dict):
+        self.files[source_file] = entry
+
+    def remove(self, source_file: str) -> List[str]:
+        """Forget a file and return the chunk ids it contributed."""
+        entry = self.files.pop(source_file, None)
+        return chunk_ids_of(entry)
+
+    def invalidate_decision(self, source_file: str, decision_key: str):
+        """Force a decision (and so its file) to be re-ingested on the next run."""
+        entry = self.files.get(source_file)
+        if entry is None:
+            return
+        entry["sha256"] = entry["size"] = None
+        decision = entry.get("decisions", {}).get(decision_key)
+        if decision is not None:
+            decision["hash"] = None
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"collection": self.collection_name, "settings": self.settings, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+
+def chunk_ids_of(entry: Optional[dict]) -> List[str]:
+    if not entry:
+        return []
+    return [cid for decision in entry.get("decisions", {}).values() for cid in decision.get("chunk_ids", [])]
+
+
+def stale_chunk_ids(previous: Optional[dict], current: dict) -> List[str]:
+    """Chunk ids recorded for ``previous`` that ``current`` no longer produces."""
+    keep = set(chunk_ids_of(current))
+    return [cid for cid in chunk_ids_of(previous) if cid not in keep]
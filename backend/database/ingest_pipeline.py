@@ -0,0 +1,283 @@
+"""Pipelined, multi-process ingestion of the ``cases/`` folder.
+
+    readers (N procs) --chunk_queue--> embedders (M procs) --vector_queue--> writer (1 proc)
+
+Readers parse and chunk case files, embedders run the embedding model on
+batches of chunks, and a single writer process owns the Chroma
+``PersistentClient``. Both queues are bounded, so a slow stage blocks the
+stages in front of it instead of buffering the whole corpus in memory.
+
+Like ``parseCases.py`` the pipeline is incremental: only files that changed
+since the last run (per the ingest manifest) are queued. Near-duplicate
+detection needs a global view of the corpus, so it runs in the writer, after
+embedding.
+
+Usage (from the ``database`` directory):
+
+    python ingest_pipeline.py --readers 4 --embedders 2
+"""
+import os
+import time
+import queue
+import argparse
+import multiprocessing as mp
+
+import parseCases
+from case_table import CaseTable
+from ingest_manifest import chunk_ids_of, stale_chunk_ids
+from near_dedup import NearDuplicateIndex
+
+# === Configuration ===
+DEFAULT_READERS = max(1, (os.cpu_count() or 2) // 2)
+DEFAULT_EMBEDDERS = 1
+QUEUE_DEPTH = 8             # batches buffered between two stages
+POLL_SECONDS = 5            # how often the parent checks for dead workers while it waits
+
+
+def _reader(file_queue, chunk_queue, result_queue, batch_size: int, chunker: str):
+    """Parse and chunk case files, emitting lists of chunk records.
+
+    For every file one ``(source_file, entry, stale_ids, case_rows, rescoring_texts)``
+    result goes back to the parent; ``entry`` is None if the file failed.
+    """
+    batch = []
+    while True:
+        item = file_queue.get()
+        if item is None:
+            break
+        file_path, previous = item
+        source_file = os.path.basename(file_path)
+        entry = {}
+        case_rows = []
+        rescoring_texts = set()
+        try:
+            for record in parseCases.iter_case_chunks(file_path, previous, entry, case_rows, chunker, rescoring_texts):
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    chunk_queue.put(batch)
+                    batch = []
+            result_queue.put((source_file, entry, stale_chunk_ids(previous, entry), case_rows, rescoring_texts))
+            print(f"✅ Chunked {source_file}")
+        except Exception as e:
+            result_queue.put((source_file, None, [], [], set()))
+            print(f"❌ Error processing {source_file}: {e}")
+    if batch:
+        chunk_queue.put(batch)
+
+
+def _embedder(chunk_queue, vector_queue, encode_batch_size: int, threads: int, use_cache: bool, backend: str):
+    """Embed chunk batches; each embedder holds its own copy of the model.
+
+    Embedders only read the embedding cache; the writer appends new vectors.
+    """
+    parseCases.set_embedding_backend(backend)
+    parseCases.get_model(threads)
+    if use_cache:
+        parseCases.get_embedding_cache(writable=False)
+    while True:
+        batch = chunk_queue.get()
+        if batch is None:
+            break
+        ids, documents, metadatas = (list(col) for col in zip(*batch))
+        t0 = time.perf_counter()
+        embeddings = parseCases.embed_texts(documents, batch_size=encode_batch_size, use_cache=use_cache)
+        vector_queue.put(("chunks", ids, documents, embeddings, metadatas, time.perf_counter() - t0))
+
+
+def _writer(vector_queue, add_batch_size: int, use_cache: bool, near_dup_threshold: float, backend: str,
+            replacing: set):
+    """Sole owner of the Chroma client, embedding cache writes and the near-duplicate index.
+
+    ``replacing`` are the previous chunk ids of the files being re-ingested;
+    new chunks are not deduplicated against them.
+    """
+    parseCases.set_embedding_backend(backend)
+    writer = parseCases.ChunkWriter(parseCases.get_collection(), add_batch_size)
+    cache = parseCases.get_embedding_cache() if use_cache else None
+    dedup = NearDuplicateIndex(parseCases.NEAR_DUP_INDEX_PATH, near_dup_threshold) if near_dup_threshold else None
+    pending = ([], [], [], [])
+    embed_seconds = 0.0
+    started_at = time.perf_counter()
+
+    def flush():
+        if pending[0]:
+            writer.write(*pending)
+            if cache is not None:
+                cache.put_many(pending[1], pending[2])
+            for column in pending:
+                column.clear()
+            print(f"📝 {parseCases.format_report(writer.chunks_written, time.perf_counter() - started_at, embed_seconds, writer.write_seconds)}")
+
+    while True:
+        item = vector_queue.get()
+        if item is None:
+            break
+        if item[0] == "delete":
+            writer.delete(item[1])
+            if dedup is not None:
+                dedup.remove(item[1])
+            continue
+        _, *columns, seconds = item
+        embed_seconds += seconds
+        for row in zip(*columns):
+            if dedup is not None and dedup.check(row[0], row[1], replacing):
+                continue
+            for column, value in zip(pending, row):
+                column.append(value)
+        if len(pending[0]) >= add_batch_size:
+            flush()
+    flush()
+
+    print(f"📊 Ingestion finished: {parseCases.format_report(writer.chunks_written, time.perf_counter() - started_at, embed_seconds, writer.write_seconds)}, "
+          f"{writer.chunks_deleted} stale chunks deleted")
+    if dedup is not None:
+        dedup.save()
+        print(f"🧬 {dedup.report()}")
+
+
+def _count_chunks(count_queue):
+    count_queue.put(parseCases.get_collection().count())
+
+
+def _check_workers(procs: list):
+    """Stop everything if a worker died; its peers would block on full queues forever."""
+    dead = [p for p in procs if p.exitcode not in (None, 0)]
+    if dead:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+        raise RuntimeError(f"{len(dead)} ingestion worker(s) exited abnormally")
+
+
+def _join(procs: list, workers: list):
+    for proc in procs:
+        while proc.exitcode is None:
+            proc.join(timeout=POLL_SECONDS)
+            _check_workers(workers)
+
+
+def run_pipeline(folder_path: str, readers: int = DEFAULT_READERS, embedders: int = DEFAULT_EMBEDDERS,
+                 encode_batch_size: int = parseCases.ENCODE_BATCH_SIZE,
+                 add_batch_size: int = parseCases.ADD_BATCH_SIZE, queue_depth: int = QUEUE_DEPTH,
+                 force: bool = False, use_cache: bool = parseCases.USE_EMBEDDING_CACHE,
+                 near_dup_threshold: float = parseCases.NEAR_DUP_THRESHOLD, chunker: str = parseCases.CHUNKER,
+                 backend: str = parseCases.EMBEDDING_BACKEND):
+    # spawn keeps torch/Chroma state out of the children; parseCases loads
+    # the model and client lazily so readers never touch either.
+    ctx = mp.get_context("spawn")
+
+    # The manifest is planned here, but the collection itself is only opened
+    # by child processes; one just reports its size for the wiped-collection check
+    count_queue = ctx.Queue()
+    counter = ctx.Process(target=_count_chunks, args=(count_queue,))
+    counter.start()
+    chunk_count = count_queue.get()
+    counter.join()
+    manifest = parseCases.load_manifest(chunk_count, chunker)
+    if near_dup_threshold:
+        # Requeue orphaned duplicates now; the writer reopens the index afterwards
+        parseCases.load_near_dup_index(manifest, near_dup_threshold).save()
+    todo, removed_files, removed_ids, unchanged = parseCases.plan_ingestion(manifest, folder_path, force)
+    print(f"📂 {len(todo)} new or changed files, {unchanged} unchanged")
+
+    file_queue = ctx.Queue()
+    result_queue = ctx.Queue()
+    chunk_queue = ctx.Queue(maxsize=queue_depth)
+    vector_queue = ctx.Queue(maxsize=queue_depth)
+
+    for file in todo:
+        file_queue.put((os.path.join(folder_path, file), None if force else manifest.get(file)))
+    for _ in range(readers):
+        file_queue.put(None)
+
+    threads = max(1, (os.cpu_count() or 1) // embedders)
+    reader_procs = [ctx.Process(target=_reader, args=(file_queue, chunk_queue, result_queue, encode_batch_size, chunker))
+                    for _ in range(readers)]
+    embedder_procs = [ctx.Process(target=_embedder, args=(chunk_queue, vector_queue, encode_batch_size, threads, use_cache, backend))
+                      for _ in range(embedders)]
+    replacing = {cid for file in todo for cid in chunk_ids_of(manifest.get(file))}
+    writer_proc = ctx.Process(target=_writer, args=(vector_queue, add_batch_size, use_cache, near_dup_threshold, backend,
+                                                    replacing))
+
+    for proc in reader_procs + embedder_procs + [writer_proc]:
+        proc.start()
+
+    if removed_ids:
+        vector_queue.put(("delete", removed_ids))
+
+    # Drain per-file results before joining, or readers could block on exit.
+    # Waits are bounded so a crashed worker fails the run instead of hanging it.
+    workers = reader_procs + embedder_procs + [writer_proc]
+    results = []
+    while len(results) < len(todo):
+        try:
+            results.append(result_queue.get(timeout=POLL_SECONDS))
+        except queue.Empty:
+            _check_workers(workers)
+
+    # Shut the stages down front to back so nothing in flight is dropped.
+    _join(reader_procs, workers)
+    stale_ids = [cid for _, _, ids, _, _ in results for cid in ids]
+    if force:
+        stale_ids += [cid for source_file, entry, _, _, _ in results if entry is not None
+                      for cid in stale_chunk_ids(manifest.get(source_file), entry)]
+    if stale_ids:
+        vector_queue.put(("delete", stale_ids))
+    for _ in embedder_procs:
+        chunk_queue.put(None)
+    _join(embedder_procs, workers)
+    vector_queue.put(None)
+    _join([writer_proc], workers)
+
+    # The writer has exited, so the parent can append to the embedding cache
+    parseCases.set_embedding_backend(backend)
+    rescoring_texts = set().union(*(texts for *_, texts in results))
+    print(f"🎯 {parseCases.embed_rescoring_texts(rescoring_texts, encode_batch_size)} new metadata-rescoring strings embedded")
+
+    # Only record files once the writer has committed their chunks
+    case_table = CaseTable(parseCases.CASE_TABLE_PATH)
+    case_table.delete_source_files(removed_files)
+    for source_file, entry, _, case_rows, _ in results:
+        if entry is not None:
+            # A changed Identifier gives the case a new key; drop the row under the old one
+            case_table.delete_source_files([source_file])
+            case_table.upsert_many(case_rows)
+            manifest.update(source_file, entry)
+    manifest.save()
+
+    # The deletes of this pass can orphan dropped duplicates; re-ingest their
+    # decisions now rather than on the next run
+    if near_dup_threshold and NearDuplicateIndex(parseCases.NEAR_DUP_INDEX_PATH, near_dup_threshold).orphans:
+        print("🔁 Re-ingesting decisions whose near-duplicate originals were deleted")
+        run_pipeline(folder_path, readers, embedders, encode_batch_size, add_batch_size, queue_depth, False,
+                     use_cache, near_dup_threshold, chunker, backend)
+
+
+# === MAIN ===
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel ingestion of case files into Chroma.")
+    parser.add_argument("--folder", default=parseCases.FOLDER_PATH, help="Folder containing the case JSON files")
+    parser.add_argument("--readers", type=int, default=DEFAULT_READERS, help="Reader/chunker processes")
+    parser.add_argument("--embedders", type=int, default=DEFAULT_EMBEDDERS, help="Embedding worker processes")
+    parser.add_argument("--encode-batch-size", type=int, default=parseCases.ENCODE_BATCH_SIZE,
+                        help="Chunks per model forward pass")
+    parser.add_argument("--add-batch-size", type=int, default=parseCases.ADD_BATCH_SIZE,
+                        help="Chunks per collection.add call in the writer")
+    parser.add_argument("--queue-depth", type=int, default=QUEUE_DEPTH,
+                        help="Batches buffered between stages (backpressure bound)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-embed every file, ignoring the ingest manifest")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Always run the model instead of reusing cached chunk embeddings")
+    parser.add_argument("--near-dup-threshold", type=float, default=parseCases.NEAR_DUP_THRESHOLD,
+                        help="Estimated Jaccard similarity at which a chunk is dropped as a near-duplicate (0 disables)")
+    parser.add_argument("--chunker", choices=["tokens", "words"], default=parseCases.CHUNKER,
+                        help="Split on the model's token window (tokens) or into 500-word windows (words)")
+    parser.add_argument("--embedding-backend", choices=parseCases.BACKENDS, default=parseCases.EMBEDDING_BACKEND,
+                        help="Run the embedding model with PyTorch or ONNX Runtime (optionally int8)")
+    args = parser.parse_args()
+
+    run_pipeline(args.folder, args.readers, args.embedders, args.encode_batch_size,
+                 args.add_batch_size, args.queue_depth, args.force, not args.no_embedding_cache,
+                 args.near_dup_threshold, args.chunker, args.embedding_backend)
+    print("✅ All embeddings processed and stored in Chroma DB.")
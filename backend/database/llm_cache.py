@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from typing import Optional
+
+# === Configuration ===
+LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join(os.path.dirname(__file__), 'llm_cache.db'))
+LLM_CACHE_MAX_MB = float(os.environ.get("LLM_CACHE_MAX_MB", "64"))
+LLM_CACHE_TTL_HOURS = float(os.environ.get("LLM_CACHE_TTL_HOURS", "168"))
+
+
+def parse_json_response(text: str):
+    """Parse a JSON reply, dropping the markdown fence Gemini sometimes wraps it in."""
+    return json.loads(text.strip().replace("```json", "").replace("```", ""))
+
+
+def prompt_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Model responses keyed by a hash of ``(model name, full prompt)``, in SQLite.
+
+    Entries expire ``ttl_seconds`` after they were stored. When the stored
+    responses exceed ``max_bytes``, the least recently used ones are evicted.
+    Only responses the caller could use should be stored.
+
+    Lookups are plain reads: their recency updates are kept in memory and
+    written with the next ``put``, the only point where eviction needs them.
+    Safe to use from several threads; the ``*_async`` variants run on the
+    default executor so the event loop never waits on SQLite.
+    """
+
+    def __init__(self, db_path: str = LLM_CACHE_PATH, max_bytes: int = int(LLM_CACHE_MAX_MB * 2 ** 20),
+                 ttl_seconds: float = LLM_CACHE_TTL_HOURS * 3600):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._touched = {}
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.create_tables()
+
+    def create_tables(self):
+        cursor = self.conn.cursor()
+        # Readers don't block the writer, and commits skip the rollback journal
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.conn.commit()
+
+    def get(self, model_name: str, prompt: str) -> Optional[str]:
+        """The stored response for this prompt, or None if missing or expired."""
+        key = prompt_key(model_name, prompt)
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT response, created_at FROM responses WHERE key = ?', (key,))
+            row = cursor.fetchone()
+            # Expired rows are left for the next eviction
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            self.hits += 1
+            return row[0]
+
+    def put(self, model_name: str, prompt: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.executemany('UPDATE responses SET last_used = ? WHERE key = ?',
+                               [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+            cursor.execute(
+                'INSERT OR REPLACE INTO responses (key, response, size, created_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                (prompt_key(model_name, prompt), response, len(response.encode("utf-8")), now, now)
+            )
+            self.evict()
+            self.conn.commit()
+
+    async def get_async(self, model_name: str, prompt: str) -> Optional[str]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, model_name, prompt)
+
+    async def put_async(self, model_name: str, prompt: str, response: str) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.put, model_name, prompt, response)
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used ones beyond ``max_bytes``."""
+        cursor = self.conn.cursor()
+        cursor.execute('DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+        cursor.execute('''
+        DELETE FROM responses WHERE key IN (
+            SELECT key FROM (
+                SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS kept FROM responses
+            ) WHERE kept > ?
+        )
+        ''', (self.max_bytes,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses')
+            entries, size = cursor.fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,150 @@
+"""Near-duplicate chunk detection with MinHash + LSH.
+
+Awards quote each other verbatim, so many chunks are near-copies of a chunk
+that is already indexed. Those add nothing to retrieval but occupy slots in
+the candidate pool and grow the index. ``NearDuplicateIndex`` keeps a
+MinHash signature per indexed chunk and flags new chunks whose estimated
+Jaccard similarity (over word shingles) to an indexed one reaches the
+threshold. Flagged chunks are not written; a link to the chunk they
+duplicate is recorded instead.
+"""
+import os
+import re
+import zlib
+from typing import Collection, Dict, List, Optional
+
+import numpy as np
+
+# === Configuration ===
+THRESHOLD = 0.85        # estimated Jaccard similarity at which a chunk counts as a duplicate
+NUM_PERM = 128          # MinHash permutations
+BANDS = 32              # LSH bands (NUM_PERM / BANDS rows per band)
+SHINGLE_WORDS = 5
+
+_PRIME = np.uint64(4294967311)  # smallest prime above 2**32
+_rng = np.random.RandomState(1234)  # fixed seed: signatures are persisted across runs
+_A = _rng.randint(1, 2 ** 32 - 1, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 2 ** 32 - 1, size=NUM_PERM, dtype=np.uint64)
+_WORD_RE = re.compile(r"\w+")
+
+
+def minhash_signature(text: str, shingle_words: int = SHINGLE_WORDS) -> np.ndarray:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < shingle_words:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + shingle_words]) for i in range(len(words) - shingle_words + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p for every permutation/shingle pair, then min per permutation
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+
+class NearDuplicateIndex:
+    """Persistent MinHash/LSH index over the chunks written to the collection."""
+
+    def __init__(self, path: str, threshold: float = THRESHOLD, bands: int = BANDS):
+        self.path = path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = NUM_PERM // bands
+        self.ids: List[str] = []
+        self.signatures: List[np.ndarray] = []
+        self.row_of: Dict[str, int] = {}
+        self.links: Dict[str, str] = {}     # duplicate chunk id -> id of the chunk it duplicates
+        self.orphans: List[str] = []        # dropped duplicates whose original was deleted
+        self._buckets: Dict[tuple, List[int]] = {}
+        self.checked = 0
+        self.dropped = 0
+
+        if os.path.exists(path):
+            data = np.load(path)
+            for chunk_id, signature in zip(data["ids"].tolist(), data["signatures"]):
+                self._add(chunk_id, signature)
+            self.links = dict(zip(data["link_from"].tolist(), data["link_to"].tolist()))
+            self.orphans = data["orphans"].tolist()
+
+    def _band_keys(self, signature: np.ndarray):
+        r = self.rows_per_band
+        return [(band, signature[band * r:(band + 1) * r].tobytes()) for band in range(self.bands)]
+
+    def _add(self, chunk_id: str, signature: np.ndarray):
+        row = len(self.ids)
+        self.ids.append(chunk_id)
+        self.signatures.append(signature)
+        self.row_of[chunk_id] = row
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(row)
+
+    def check(self, chunk_id: str, text: str, exclude: Collection[str] = ()) -> Optional[str]:
+        """Return the id of an indexed near-duplicate of ``text``, or index it and return None.
+
+        Chunks in ``exclude`` never count as the original: they are the
+        previous version of the file being re-ingested and are about to be
+        deleted, so an edited chunk must not be dropped as a copy of itself.
+        """
+        self.checked += 1
+        if chunk_id in self.row_of:
+            # Re-ingesting a chunk we already hold is an overwrite, not a duplicate
+            return None
+        signature = minhash_signature(text)
+
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best_id, best_score = None, self.threshold
+        for row in candidates:
+            if self.ids[row] is None or self.ids[row] in exclude:
+                continue
+            score = float(np.mean(self.signatures[row] == signature))
+            if score >= best_score:
+                best_id, best_score = self.ids[row], score
+
+        if best_id is not None:
+            self.dropped += 1
+            self.links[chunk_id] = best_id
+            return best_id
+        self._add(chunk_id, signature)
+        return None
+
+    def remove(self, chunk_ids: List[str]):
+        """Forget deleted chunks.
+
+        Dropped duplicates that pointed at them are no longer represented in
+        the collection; they are moved to ``orphans`` so that their decisions
+        get re-ingested.
+        """
+        removed = set()
+        for chunk_id in chunk_ids:
+            self.links.pop(chunk_id, None)
+            row = self.row_of.pop(chunk_id, None)
+            if row is not None:
+                self.ids[row] = None
+                removed.add(chunk_id)
+        orphans = [dup for dup, original in self.links.items() if original in removed]
+        for dup in orphans:
+            del self.links[dup]
+        self.orphans.extend(orphans)
+
+    def save(self):
+        alive = [row for row, chunk_id in enumerate(self.ids) if chunk_id is not None]
+        signatures = np.array([self.signatures[row] for row in alive], dtype=np.uint64).reshape(-1, NUM_PERM)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            ids=np.array([self.ids[row] for row in alive], dtype=str),
+            signatures=signatures,
+            link_from=np.array(list(self.links.keys()), dtype=str),
+            link_to=np.array(list(self.links.values()), dtype=str),
+            orphans=np.array(self.orphans, dtype=str),
+        )
+        os.replace(tmp_path, self.path)
+
+    def report(self) -> str:
+        kept = len(self.row_of)
+        share = self.dropped / self.checked if self.checked else 0.0
+        return (
+            f"near-duplicates: {self.dropped} of {self.checked} new chunks dropped ({share:.1%}); "
+            f"collection holds {kept} distinct chunks, {len(self.links)} linked duplicates "
+            f"({len(self.links) / max(kept + len(self.links), 1):.1%} smaller than without dedup)"
+        )
@@ -1,30 +1,93 @@
 import os
 import json
 import re
-from uuid import uuid4
-from typing import List
+import hashlib
+import time
+import argparse
+from typing import Collection, List, Optional
 
-from sentence_transformers import SentenceTransformer
+from transformers import AutoTokenizer
 from chromadb import PersistentClient
 
+from case_reader import read_case_file
+from case_table import CaseTable
+from collection_settings import open_collection
+from embedding_backend import BACKENDS, EMBEDDING_BACKEND, backend_cache_name, load_embedding_model
+from embedding_cache import EmbeddingCache
+from ingest_manifest import IngestManifest, chunk_ids_of, file_fingerprint, sha256_hex, stale_chunk_ids
+from near_dedup import NearDuplicateIndex, THRESHOLD as NEAR_DUP_THRESHOLD
+from rescoring import rescoring_text
+from sharded_collection import ShardedCollection, open_chunk_collection, source_file_of
+from text_repair import TEXT_REPAIRED_KEY, fix_mojibake
+
 # === Configuration ===
 FOLDER_PATH = "cases"
 MAX_TOKENS = 500
 OVERLAP = 100
+# "tokens" cuts chunks at the model's real word-piece window on sentence
+# boundaries; "words" is the original 500-word splitter
+CHUNKER = "tokens"
+TOKEN_OVERLAP = 32          # word-pieces of trailing context carried into the next chunk
+ENCODE_BATCH_SIZE = 64      # chunks per model forward pass
+ADD_BATCH_SIZE = 2048       # records per collection.add call
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_MAX_SEQ_LENGTH = 256  # all-MiniLM-L6-v2 truncates inputs beyond this many word-pieces
 DATA_DIR = os.path.join(os.path.dirname(__file__), 'chroma_data')
-
-# === Initialize Chroma client and collection ===
-client = PersistentClient(path=DATA_DIR)
 collection_name = "legal_cases"
+MANIFEST_PATH = os.path.join(DATA_DIR, 'ingest_manifest.json')
+CASE_TABLE_PATH = os.path.join(DATA_DIR, 'case_table.db')
+NEAR_DUP_INDEX_PATH = os.path.join(DATA_DIR, 'near_duplicates.npz')
+# Bump when the shape of chunk records changes, so the next run rewrites them
+CHUNK_LAYOUT_VERSION = 3
+USE_EMBEDDING_CACHE = True  # reuse vectors of unchanged chunk text across rebuilds
+
+# === Lazily initialized Chroma client, collection and model ===
+# Loaded on first use so that worker processes of the parallel ingester only
+# pay for the pieces they actually need (see ingest_pipeline.py).
+_client = None
+_collection = None
+_model = None
+_tokenizer = None
+_embedding_cache = None
+
+
+def get_collection():
+    global _client, _collection
+    if _collection is None:
+        _client = PersistentClient(path=DATA_DIR)
+        # Everything written through this module is repaired, so a new collection starts clean
+        _collection = open_chunk_collection(_client, collection_name, open_collection, {TEXT_REPAIRED_KEY: 1})
+    return _collection
+
+
+def set_embedding_backend(backend: str):
+    """Select the embedding backend (torch, onnx, onnx-int8) before the model is loaded."""
+    global EMBEDDING_BACKEND
+    if _model is not None and backend != EMBEDDING_BACKEND:
+        raise RuntimeError("Embedding model already loaded with another backend")
+    EMBEDDING_BACKEND = backend
 
-if collection_name in [c.name for c in client.list_collections()]:
-    collection = client.get_collection(collection_name)
-else:
-    collection = client.create_collection(name=collection_name)
 
-# === Load SentenceTransformer model ===
-model = SentenceTransformer(MODEL_NAME)
+def get_model(threads: Optional[int] = None):
+    global _model
+    if _model is None:
+        _model = load_embedding_model(MODEL_NAME, EMBEDDING_BACKEND, threads)
+    return _model
+
+
+def get_tokenizer():
+    """The model's fast tokenizer, without loading the model weights if we don't have them yet."""
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = _model.tokenizer if _model is not None else AutoTokenizer.from_pretrained(MODEL_NAME)
+    return _tokenizer
+
+
+def get_embedding_cache(writable: bool = True) -> EmbeddingCache:
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache(backend_cache_name(MODEL_NAME, EMBEDDING_BACKEND), writable=writable)
+    return _embedding_cache
 
 
 # === Utility functions ===
@@ -40,21 +103,285 @@ def chunk_text(text: str, max_tokens: int = MAX_TOKENS, overlap: int = OVERLAP)
     return chunks
 
 
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n\s*\n")
+
+
+def _sentence_spans(text: str) -> List[tuple]:
+    """Character spans of the sentences (or paragraphs) of ``text``."""
+    spans = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        if match.start() > start:
+            spans.append((start, match.start()))
+        start = match.end()
+    if start < len(text) and text[start:].strip():
+        spans.append((start, len(text)))
+    return spans
+
+
+def chunk_text_tokens(text: str, max_tokens: int = MODEL_MAX_SEQ_LENGTH - 2,
+                      overlap: int = TOKEN_OVERLAP) -> List[str]:
+    """Split ``text`` into chunks that fit the embedding model's window.
+
+    Sentences are tokenized in one batched call and packed greedily up to
+    ``max_tokens`` word-pieces (the window minus [CLS]/[SEP]), so nothing a
+    chunk stores is truncated away by the model. Sentences longer than the
+    window are cut at token boundaries using the offset mapping.
+    """
+    spans = _sentence_spans(text)
+    if not spans:
+        return []
+    encoded = get_tokenizer()(
+        [text[start:end] for start, end in spans],
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+    )
+
+    # (start_char, end_char, n_tokens) units that each fit the window
+    units = []
+    for (start, _), offsets in zip(spans, encoded["offset_mapping"]):
+        if not offsets:
+            continue
+        for i in range(0, len(offsets), max_tokens):
+            piece = offsets[i:i + max_tokens]
+            units.append((start + piece[0][0], start + piece[-1][1], len(piece)))
+
+    chunks = []
+    current, current_tokens = [], 0
+    for unit in units:
+        if current and current_tokens + unit[2] > max_tokens:
+            chunks.append(text[current[0][0]:current[-1][1]])
+            # Carry whole trailing sentences, up to ``overlap`` tokens, into the next chunk
+            carry, carry_tokens = [], 0
+            for previous in reversed(current):
+                if carry_tokens + previous[2] > overlap:
+                    break
+                carry.insert(0, previous)
+                carry_tokens += previous[2]
+            while carry and carry_tokens + unit[2] > max_tokens:
+                carry_tokens -= carry.pop(0)[2]
+            current, current_tokens = carry, carry_tokens
+        current.append(unit)
+        current_tokens += unit[2]
+    if current:
+        chunks.append(text[current[0][0]:current[-1][1]])
+    return chunks
+
+
+def chunk_decision(content: str, chunker: str = CHUNKER) -> List[str]:
+    if chunker == "tokens":
+        return chunk_text_tokens(content)
+    return chunk_text(content)
+
+
+def chunker_signature(chunker: str = CHUNKER) -> str:
+    """Identifies the chunk layout and chunking settings; part of each decision's hash."""
+    if chunker == "tokens":
+        return f"{CHUNK_LAYOUT_VERSION}:tokens:{MODEL_NAME}:{MODEL_MAX_SEQ_LENGTH}:{TOKEN_OVERLAP}"
+    return f"{CHUNK_LAYOUT_VERSION}:words:{MAX_TOKENS}:{OVERLAP}"
+
+
 def embed_text(text: str) -> List[float]:
-    embedding = model.encode(text, show_progress_bar=False, normalize_embeddings=True)
+    embedding = get_model().encode(text, show_progress_bar=False, normalize_embeddings=True)
     return embedding.tolist()
 
 
+def embed_texts(texts: List[str], batch_size: int = ENCODE_BATCH_SIZE,
+                use_cache: bool = True) -> List[List[float]]:
+    """Embed many chunks with a single batched model.encode call.
+
+    With ``use_cache`` only texts missing from the embedding cache reach the
+    model; new vectors are written back if the cache is writable.
+    """
+    def encode(batch: List[str]):
+        return get_model().encode(
+            batch,
+            batch_size=batch_size,
+            show_progress_bar=False,
+            normalize_embeddings=True,
+        )
+
+    if not use_cache:
+        return encode(texts).tolist()
+    return get_embedding_cache().encode(texts, encode).tolist()
+
+
+def embed_rescoring_texts(texts, batch_size: int = ENCODE_BATCH_SIZE) -> int:
+    """Store the vectors of the metadata-rescoring strings in the embedding cache.
+
+    ``EmbeddingService`` looks them up there at query time instead of running
+    the model on every candidate. They go into the cache even when chunk
+    embeddings bypass it; the model is only loaded for strings not cached yet.
+    Returns the number of strings embedded.
+    """
+    cache = get_embedding_cache()
+    rows = len(cache)
+    cache.encode(sorted(set(texts)), lambda batch: get_model().encode(
+        batch, batch_size=batch_size, show_progress_bar=False, normalize_embeddings=True))
+    return len(cache) - rows
+
+
 def normalize_metadata(value):
+    """Flatten lists for Chroma and repair mis-decoded text, once, at ingest."""
     if isinstance(value, list):
-        return ", ".join(map(str, value))
-    return value
+        return ", ".join(fix_mojibake(str(item)) for item in value)
+    return fix_mojibake(value)
+
+
+_YEAR = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+
+
+def decision_year(date) -> Optional[int]:
+    """The year of a decision date string, stored on chunks for range filters."""
+    match = _YEAR.search(str(date)) if date else None
+    return int(match.group(1)) if match else None
+
+
+def make_chunk_id(source_file: str, decision_index: int, chunk_index: int, chunk: str) -> str:
+    """Deterministic chunk id, so re-ingesting the same text overwrites instead of duplicating."""
+    return f"{source_file}:{decision_index}:{chunk_index}:{sha256_hex(chunk)[:16]}"
+
+
+def list_case_files(folder_path: str) -> List[str]:
+    """Return the case JSON files in ``folder_path`` sorted by their number."""
+    def extract_number(filename: str) -> int:
+        match = re.search(r"(\d+)", filename)
+        return int(match.group(1)) if match else float('inf')
+
+    json_files = [
+        f for f in os.listdir(folder_path)
+        if f.endswith(".json")
+    ]
+
+    # Sort files numerically based on the number in the filename
+    return sorted(json_files, key=extract_number)
+
+
+class ChunkWriter:
+    """Writes already-embedded chunks to the collection in large slices."""
+
+    def __init__(self, collection, add_batch_size: int = ADD_BATCH_SIZE):
+        self.collection = collection
+        self.add_batch_size = add_batch_size
+        self.chunks_written = 0
+        self.chunks_deleted = 0
+        self.write_seconds = 0.0
+
+    def write(self, ids: list, documents: list, embeddings: list, metadatas: list):
+        t0 = time.perf_counter()
+        for start in range(0, len(ids), self.add_batch_size):
+            end = start + self.add_batch_size
+            # upsert keeps re-runs idempotent: unchanged chunks keep their id
+            self.collection.upsert(
+                documents=documents[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=metadatas[start:end],
+                ids=ids[start:end]
+            )
+        self.write_seconds += time.perf_counter() - t0
+        self.chunks_written += len(ids)
+
+    def delete(self, ids: list):
+        for start in range(0, len(ids), self.add_batch_size):
+            self.collection.delete(ids=ids[start:start + self.add_batch_size])
+        self.chunks_deleted += len(ids)
+
+
+class BatchIngester:
+    """Buffers chunks across decisions and files and writes them in bulk.
+
+    Chunks are embedded with one ``model.encode`` call per buffer and sent to
+    Chroma in ``add_batch_size`` slices, instead of one forward pass and one
+    ``collection.add`` per chunk.
+    """
+
+    def __init__(self, collection, encode_batch_size: int = ENCODE_BATCH_SIZE,
+                 add_batch_size: int = ADD_BATCH_SIZE, use_cache: bool = USE_EMBEDDING_CACHE,
+                 dedup: Optional[NearDuplicateIndex] = None):
+        self.writer = ChunkWriter(collection, add_batch_size)
+        self.encode_batch_size = encode_batch_size
+        self.add_batch_size = add_batch_size
+        self.use_cache = use_cache
+        self.dedup = dedup
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self.embed_seconds = 0.0
+        self.started_at = time.perf_counter()
+
+    @property
+    def chunks_written(self) -> int:
+        return self.writer.chunks_written
+
+    def add(self, document: str, metadata: dict, chunk_id: str, replacing: Collection[str] = ()):
+        """Queue a chunk; ``replacing`` are the chunk ids of the previous version of its file."""
+        if self.dedup is not None and self.dedup.check(chunk_id, document, replacing):
+            return
+        self._ids.append(chunk_id)
+        self._documents.append(document)
+        self._metadatas.append(metadata)
+        if len(self._documents) >= self.add_batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._documents:
+            return
+
+        t0 = time.perf_counter()
+        embeddings = embed_texts(self._documents, batch_size=self.encode_batch_size, use_cache=self.use_cache)
+        self.embed_seconds += time.perf_counter() - t0
+
+        self.writer.write(self._ids, self._documents, embeddings, self._metadatas)
+        self._ids, self._documents, self._metadatas = [], [], []
+
+    def delete(self, ids: list):
+        if ids:
+            self.writer.delete(ids)
+            if self.dedup is not None:
+                self.dedup.remove(ids)
+
+    def report(self) -> str:
+        return format_report(self.chunks_written, time.perf_counter() - self.started_at,
+                             self.embed_seconds, self.writer.write_seconds,
+                             get_embedding_cache().stats() if self.use_cache else None)
+
+
+def format_report(chunks: int, elapsed: float, embed_seconds: float, write_seconds: float,
+                  cache_stats: Optional[dict] = None) -> str:
+    elapsed = max(elapsed, 1e-9)
+    report = (
+        f"{chunks} chunks in {elapsed:.1f}s "
+        f"({chunks / elapsed:.1f} chunks/sec; "
+        f"embed {embed_seconds:.1f}s, write {write_seconds:.1f}s"
+    )
+    if cache_stats:
+        report += f"; embedding cache hit rate {cache_stats['hit_rate']:.0%}"
+    return report + ")"
 
 
 # === Core file processing ===
-def process_case_file(file_path: str):
-    with open(file_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+def iter_case_chunks(file_path: str, previous: Optional[dict] = None, entry: Optional[dict] = None,
+                     case_rows: Optional[list] = None, chunker: str = CHUNKER,
+                     rescoring_texts: Optional[set] = None):
+    """Yield ``(chunk_id, document, metadata)`` for the chunks of a case file.
+
+    The file is streamed: the header is read without the decision texts and
+    decisions are then parsed and chunked one at a time.
+
+    Chunk metadata only holds the ``case_key`` and decision fields; the
+    case-level fields are appended to ``case_rows`` as one
+    ``(case_key, source_file, case_metadata)`` row for the case table.
+
+    The metadata-rescoring string of every decision, skipped or not, is
+    added to ``rescoring_texts`` so it can be embedded once at ingest time.
+
+    Decisions whose hash matches the ``previous`` manifest entry are skipped.
+    If ``entry`` is given it is filled with the file's new manifest entry as
+    the generator is consumed.
+    """
+    digest = hashlib.sha256()
+    data, decisions = read_case_file(file_path, digest=digest)
+    source_file = os.path.basename(file_path)
 
     case_metadata = {
         "Identifier": normalize_metadata(data.get("Identifier")),
@@ -67,61 +394,228 @@ def process_case_file(file_path: str):
         "RulesOfArbitration": normalize_metadata(data.get("RulesOfArbitration", [])),
         "ApplicableTreaties": normalize_metadata(data.get("ApplicableTreaties", [])),
     }
+    case_key = case_metadata["Identifier"] or source_file
+    if case_rows is not None:
+        case_rows.append((case_key, source_file, case_metadata))
+    # Only the case key is stored on chunks, so header edits don't re-embed anything
+    chunk_prefix = f"{chunker_signature(chunker)}:{case_key}:"
+
+    if entry is None:
+        entry = {}
+    entry.update(sha256=digest.hexdigest(), decisions={}, **file_fingerprint(file_path))
+    previous_decisions = (previous or {}).get("decisions", {})
 
-    for decision in data.get("Decisions", []):
-        content = decision.get("Content")
-        if not content:
+    for decision_index, decision in enumerate(decisions):
+        key = str(decision_index)
+        if rescoring_texts is not None:
+            rescoring_texts.add(rescoring_text({
+                "PartyNationalities": case_metadata["PartyNationalities"],
+                "DecisionDate": normalize_metadata(decision.get("Date")),
+            }))
+        decision_hash = sha256_hex(chunk_prefix + json.dumps(decision, sort_keys=True, ensure_ascii=False))
+        if previous_decisions.get(key, {}).get("hash") == decision_hash:
+            entry["decisions"][key] = previous_decisions[key]
             continue
 
-        decision_metadata = {
-            "DecisionTitle": normalize_metadata(decision.get("Title")),
-            "DecisionType": normalize_metadata(decision.get("Type")),
-            "DecisionDate": normalize_metadata(decision.get("Date")),
-        }
-
-        chunks = chunk_text(content)
-        for i, chunk in enumerate(chunks):
-            embedding = embed_text(chunk)
-            metadata = {
-                **case_metadata,
-                **decision_metadata,
-                "chunk_index": i,
-                "chunk": chunk,
-                "source_file": os.path.basename(file_path)
+        chunk_ids = []
+        content = fix_mojibake(decision.get("Content"))
+        if content:
+            decision_metadata = {
+                "DecisionTitle": normalize_metadata(decision.get("Title")),
+                "DecisionType": normalize_metadata(decision.get("Type")),
+                "DecisionDate": normalize_metadata(decision.get("Date")),
+                "DecisionYear": decision_year(decision.get("Date")),
             }
 
-            collection.add(
-                documents=[chunk],
-                embeddings=[embedding],
-                metadatas=[metadata],
-                ids=[str(uuid4())]
-            )
+            chunks = chunk_decision(content, chunker)
+            for i, chunk in enumerate(chunks):
+                metadata = {
+                    "case_key": case_key,
+                    **decision_metadata,
+                    "decision_index": decision_index,
+                    "chunk_index": i,
+                    "source_file": source_file
+                }
+                # Chroma rejects None values; a missing field is simply left out
+                metadata = {k: v for k, v in metadata.items() if v is not None}
+                chunk_id = make_chunk_id(source_file, decision_index, i, chunk)
+                chunk_ids.append(chunk_id)
+                yield chunk_id, chunk, metadata
 
+        entry["decisions"][key] = {"hash": decision_hash, "chunk_ids": chunk_ids}
 
-def process_all_files(folder_path: str):
-    def extract_number(filename: str) -> int:
-        match = re.search(r"(\d+)", filename)
-        return int(match.group(1)) if match else float('inf')
 
-    json_files = [
-        f for f in os.listdir(folder_path)
-        if f.endswith(".json")
+def process_case_file(file_path: str, ingester: BatchIngester, previous: Optional[dict] = None,
+                      case_table: Optional[CaseTable] = None, chunker: str = CHUNKER,
+                      rescoring_texts: Optional[set] = None, replacing: Optional[set] = None) -> dict:
+    """Ingest new/changed decisions of one file and drop its stale chunks.
+
+    ``replacing`` are the file's chunk ids from its last ingestion (those of
+    ``previous`` by default); new chunks are not deduplicated against them.
+    Returns the file's new manifest entry.
+    """
+    entry = {}
+    case_rows = []
+    if replacing is None:
+        replacing = set(chunk_ids_of(previous))
+    for chunk_id, chunk, metadata in iter_case_chunks(file_path, previous, entry, case_rows, chunker, rescoring_texts):
+        ingester.add(chunk, metadata, chunk_id, replacing)
+    ingester.delete(stale_chunk_ids(previous, entry))
+    if case_table is not None:
+        # A changed Identifier gives the case a new key; drop the row under the old one
+        case_table.delete_source_files([os.path.basename(file_path)])
+        case_table.upsert_many(case_rows)
+    return entry
+
+
+def load_manifest(chunk_count: int, chunker: str = CHUNKER) -> IngestManifest:
+    """The ingest manifest, emptied if the collection (``chunk_count`` chunks) was wiped."""
+    manifest = IngestManifest(MANIFEST_PATH, collection_name, chunker_signature(chunker))
+    if manifest.files and chunk_count == 0:
+        # The collection was wiped behind the manifest's back; start over
+        print("⚠️ Collection is empty, ignoring existing ingest manifest")
+        manifest.files = {}
+    return manifest
+
+
+def load_near_dup_index(manifest: IngestManifest, threshold: float = NEAR_DUP_THRESHOLD) -> NearDuplicateIndex:
+    """Open the near-duplicate index and requeue decisions whose duplicates lost their original."""
+    if not manifest.files and os.path.exists(NEAR_DUP_INDEX_PATH):
+        # Nothing is ingested yet, so nothing can be a duplicate of it
+        os.remove(NEAR_DUP_INDEX_PATH)
+    dedup = NearDuplicateIndex(NEAR_DUP_INDEX_PATH, threshold)
+    requeue_orphans(dedup, manifest)
+    return dedup
+
+
+def requeue_orphans(dedup: NearDuplicateIndex, manifest: IngestManifest) -> set:
+    """Mark the decisions of orphaned duplicates for re-ingestion; returns their files."""
+    source_files = set()
+    for chunk_id in dedup.orphans:
+        source_file, decision_key, _, _ = chunk_id.rsplit(":", 3)
+        manifest.invalidate_decision(source_file, decision_key)
+        source_files.add(source_file)
+    dedup.orphans = []
+    return source_files
+
+
+def plan_ingestion(manifest: IngestManifest, folder_path: str, force: bool = False):
+    """Split the folder into files to (re)ingest and files that were removed.
+
+    Returns ``(file_names, removed_files, removed_chunk_ids, unchanged_count)``.
+    """
+    files = list_case_files(folder_path)
+    removed_files = sorted(set(manifest.files) - set(files))
+    removed_ids = []
+    for source_file in removed_files:
+        removed_ids.extend(manifest.remove(source_file))
+        print(f"🗑️ {source_file} no longer exists, removing its chunks")
+
+    todo = [
+        f for f in files
+        if force or not manifest.is_unchanged(f, os.path.join(folder_path, f))
     ]
+    return todo, removed_files, removed_ids, len(files) - len(todo)
 
-    # Sort files numerically based on the number in the filename
-    sorted_files = sorted(json_files, key=extract_number)
 
-    for file in sorted_files:
+def rebuild_shard(shard_key: str, chunker: str = CHUNKER) -> int:
+    """Drop one shard and forget its files, so the next run re-ingests just them.
+
+    Chunks the same files left in other shards (year shards split a file by
+    decision year) are deleted too. Returns the number of files requeued.
+    """
+    collection = get_collection()
+    if not isinstance(collection, ShardedCollection):
+        raise SystemExit("❌ --rebuild-shard needs a sharded collection (set SHARD_BY)")
+    source_files = {source_file_of(chunk_id) for chunk_id in collection.drop_shard(shard_key)}
+    manifest = IngestManifest(MANIFEST_PATH, collection_name, chunker_signature(chunker))
+    leftover_ids = []
+    for source_file in source_files:
+        leftover_ids.extend(manifest.remove(source_file))
+    if leftover_ids:
+        ChunkWriter(collection).delete(leftover_ids)
+    manifest.save()
+    print(f"🧹 Dropped shard {shard_key}, requeued {len(source_files)} files")
+    return len(source_files)
+
+
+def process_all_files(folder_path: str, encode_batch_size: int = ENCODE_BATCH_SIZE,
+                      add_batch_size: int = ADD_BATCH_SIZE, force: bool = False,
+                      use_cache: bool = USE_EMBEDDING_CACHE, near_dup_threshold: Optional[float] = NEAR_DUP_THRESHOLD,
+                      chunker: str = CHUNKER):
+    collection = get_collection()
+    manifest = load_manifest(collection.count(), chunker)
+    dedup = load_near_dup_index(manifest, near_dup_threshold) if near_dup_threshold else None
+    ingester = BatchIngester(collection, encode_batch_size, add_batch_size, use_cache, dedup)
+    case_table = CaseTable(CASE_TABLE_PATH)
+    rescoring_texts = set()
+
+    todo, removed_files, removed_ids, unchanged = plan_ingestion(manifest, folder_path, force)
+    ingester.delete(removed_ids)
+    case_table.delete_source_files(removed_files)
+    print(f"📂 {len(todo)} new or changed files, {unchanged} unchanged")
+
+    def ingest(file: str, force_file: bool):
         file_path = os.path.join(folder_path, file)
+        previous = manifest.get(file)
         try:
-            process_case_file(file_path)
-            print(f"✅ Processed and inserted {file}")
+            entry = process_case_file(file_path, ingester, None if force_file else previous, case_table, chunker,
+                                      rescoring_texts, set(chunk_ids_of(previous)))
+            if force_file:
+                ingester.delete(stale_chunk_ids(previous, entry))
+            manifest.update(file, entry)
+            print(f"✅ Queued {file} ({ingester.report()})")
         except Exception as e:
             print(f"❌ Error processing {file}: {e}")
 
+    for file in todo:
+        ingest(file, force)
+
+    # Deletes above (removed files, stale chunks) can orphan dropped
+    # duplicates; re-ingest their decisions now rather than on the next run
+    while dedup is not None and dedup.orphans:
+        requeued = sorted(f for f in requeue_orphans(dedup, manifest) if f in manifest.files)
+        print(f"🔁 Re-ingesting {len(requeued)} files whose near-duplicate originals were deleted")
+        for file in requeued:
+            ingest(file, False)
+
+    ingester.flush()
+    print(f"🎯 {embed_rescoring_texts(rescoring_texts, encode_batch_size)} new metadata-rescoring strings embedded")
+    manifest.save()
+    print(f"📊 Ingestion finished: {ingester.report()}, {ingester.writer.chunks_deleted} stale chunks deleted")
+    if dedup is not None:
+        dedup.save()
+        print(f"🧬 {dedup.report()}")
+    return ingester
+
 
 # === MAIN ===
 if __name__ == "__main__":
-    process_all_files(FOLDER_PATH)
-    collection.persist()
+    parser = argparse.ArgumentParser(description="Embed case files into the Chroma collection.")
+    parser.add_argument("--folder", default=FOLDER_PATH, help="Folder containing the case JSON files")
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE,
+                        help="Chunks per model forward pass")
+    parser.add_argument("--add-batch-size", type=int, default=ADD_BATCH_SIZE,
+                        help="Chunks buffered before each embed + collection.add round")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-embed every file, ignoring the ingest manifest")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Always run the model instead of reusing cached chunk embeddings")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD,
+                        help="Estimated Jaccard similarity at which a chunk is dropped as a near-duplicate (0 disables)")
+    parser.add_argument("--chunker", choices=["tokens", "words"], default=CHUNKER,
+                        help="Split on the model's token window (tokens) or into 500-word windows (words)")
+    parser.add_argument("--embedding-backend", choices=BACKENDS, default=EMBEDDING_BACKEND,
+                        help="Run the embedding model with PyTorch or ONNX Runtime (optionally int8)")
+    parser.add_argument("--rebuild-shard", metavar="KEY",
+                        help="Drop one shard (e.g. h02, y2015) and re-ingest only the files it held")
+    args = parser.parse_args()
+
+    set_embedding_backend(args.embedding_backend)
+    if args.rebuild_shard:
+        rebuild_shard(args.rebuild_shard, args.chunker)
+
+    process_all_files(args.folder, args.encode_batch_size, args.add_batch_size, args.force,
+                      not args.no_embedding_cache, args.near_dup_threshold, args.chunker)
+    get_collection().persist()
     print("✅ All embeddings processed and stored in Chroma DB.")
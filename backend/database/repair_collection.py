@@ -0,0 +1,97 @@
+"""One-off migration: repair mojibake in an already ingested collection.
+
+Rewrites the chunk documents and metadata of the Chroma collection and the
+rows of the case table with ``text_repair.repair_value``, re-embeds only the
+chunks whose text actually changed, and then marks the collection as
+repaired so ``EmbeddingService`` stops repairing text per query.
+
+Usage (from the ``database`` directory):
+
+    python repair_collection.py
+"""
+import os
+import time
+import argparse
+
+import parseCases
+from case_table import CaseTable
+from embedding_backend import BACKENDS, EMBEDDING_BACKEND
+from text_repair import TEXT_REPAIRED_KEY, is_repaired, repair_value
+
+PAGE_SIZE = 2048
+
+
+def repair_chunks(collection, page_size: int = PAGE_SIZE, use_cache: bool = parseCases.USE_EMBEDDING_CACHE) -> int:
+    """Rewrite every chunk whose document or metadata changes. Returns the number rewritten."""
+    writer = parseCases.ChunkWriter(collection, page_size)
+    total = collection.count()
+    rewritten = 0
+    # Ids are stable and rows are updated in place, so paging by offset is safe
+    for offset in range(0, total, page_size):
+        page = collection.get(limit=page_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+        ids, documents, embeddings, metadatas = [], [], [], []
+        retext = []
+        for chunk_id, document, embedding, metadata in zip(page["ids"], page["documents"], page["embeddings"], page["metadatas"]):
+            fixed_document, fixed_metadata = repair_value(document), repair_value(metadata)
+            if fixed_document == document and fixed_metadata == metadata:
+                continue
+            if fixed_document != document:
+                retext.append(len(ids))
+            ids.append(chunk_id)
+            documents.append(fixed_document)
+            embeddings.append(embedding)
+            metadatas.append(fixed_metadata)
+        if retext:
+            fresh = parseCases.embed_texts([documents[i] for i in retext], use_cache=use_cache)
+            for i, embedding in zip(retext, fresh):
+                embeddings[i] = embedding
+        if ids:
+            writer.write(ids, documents, embeddings, metadatas)
+            rewritten += len(ids)
+        print(f"🔧 {min(offset + page_size, total)}/{total} chunks checked, {rewritten} rewritten")
+    return rewritten
+
+
+def repair_case_table(case_table: CaseTable) -> int:
+    rows = case_table.load_rows()
+    fixed = [(repair_value(key), source_file, repair_value(metadata)) for key, source_file, metadata in rows]
+    changed_files = {new[1] for old, new in zip(rows, fixed) if new != old}
+    # Keys can change too, so drop the affected files' rows before writing them back
+    case_table.delete_source_files(changed_files)
+    case_table.upsert_many([row for row in fixed if row[1] in changed_files])
+    return sum(new != old for old, new in zip(rows, fixed))
+
+
+def mark_repaired(collection):
+    # modify() replaces the metadata, so carry over what is already there
+    collection.modify(metadata={**(collection.metadata or {}), TEXT_REPAIRED_KEY: 1})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repair mojibake in the stored chunks and case table.")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="Chunks read and rewritten per round")
+    parser.add_argument("--force", action="store_true", help="Run even if the collection is already marked repaired")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Always run the model for re-embedded chunks instead of reusing cached vectors")
+    parser.add_argument("--embedding-backend", choices=BACKENDS, default=EMBEDDING_BACKEND,
+                        help="Backend the collection was embedded with")
+    args = parser.parse_args()
+
+    parseCases.set_embedding_backend(args.embedding_backend)
+    collection = parseCases.get_collection()
+    if is_repaired(collection) and not args.force:
+        print("✅ Collection is already marked repaired; nothing to do (use --force to re-check)")
+        raise SystemExit(0)
+
+    started_at = time.perf_counter()
+    chunks = repair_chunks(collection, args.page_size, not args.no_embedding_cache)
+    case_table = CaseTable(parseCases.CASE_TABLE_PATH)
+    try:
+        cases = repair_case_table(case_table)
+    finally:
+        case_table.close()
+    mark_repaired(collection)
+    if os.path.exists(parseCases.MANIFEST_PATH):
+        # Signals readers that snapshot the collection (the NumPy index) to rebuild
+        os.utime(parseCases.MANIFEST_PATH)
+    print(f"✅ Repaired {chunks} chunks and {cases} cases in {time.perf_counter() - started_at:.1f}s")
@@ -0,0 +1,13 @@
+def rescoring_text(metadata: dict) -> str:
+    """The metadata string a search candidate is rescored on in ``search_similar_cases``.
+
+    ``metadata`` is a chunk's metadata joined with its case's fields. The
+    ingester embeds these strings ahead of time, so they must be built the
+    same way on both sides.
+    """
+    parts = []
+    if metadata.get("PartyNationalities"):
+        parts.append(f"Parties: {metadata['PartyNationalities']}")
+    if metadata.get("DecisionDate"):
+        parts.append(f"Date: {metadata['DecisionDate']}")
+    return ". ".join(parts)
@@ -0,0 +1,235 @@
+"""Chunks spread over several Chroma collections, used like one collection.
+
+``SHARD_BY`` selects the layout:
+
+- ``none``: a single collection (the default)
+- ``hash``: ``SHARD_COUNT`` collections ``<name>__h00``...; a case file's
+  chunks all land in the shard picked by a hash of its file name
+- ``year``: one collection per ``SHARD_YEAR_SPAN`` decision years
+  (``<name>__y2010``...), plus ``<name>__yunknown`` for undated decisions;
+  year-filtered searches skip the shards outside the range
+
+Each shard is its own HNSW index, so its size, and the latency of a query
+fanned out over the shards in parallel, follows the shard rather than the
+whole corpus. A shard can be dropped and rebuilt on its own
+(``parseCases.py --rebuild-shard``); other processes holding the collection
+pick that up on ``refresh()``, or when a query hits a shard that is gone.
+"""
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# === Configuration ===
+SHARD_BY = os.environ.get("SHARD_BY", "none")
+SHARD_COUNT = int(os.environ.get("SHARD_COUNT", "4"))
+SHARD_YEAR_SPAN = int(os.environ.get("SHARD_YEAR_SPAN", "5"))
+SHARD_SEARCH_THREADS = int(os.environ.get("SHARD_SEARCH_THREADS", "8"))
+DEFAULT_INCLUDE = ["metadatas", "documents", "distances"]
+
+
+def source_file_of(chunk_id: str) -> str:
+    """Chunk ids are ``<source_file>:<decision>:<chunk>:<hash>``."""
+    return chunk_id.rsplit(":", 3)[0]
+
+
+def _year_bounds(where: Optional[dict]):
+    """``(lowest, highest)`` DecisionYear allowed by ``where``; None where unbounded."""
+    low = high = None
+    clauses = (where or {}).get("$and", [where] if where else [])
+    for clause in clauses:
+        condition = clause.get("DecisionYear")
+        if isinstance(condition, dict):
+            low = condition.get("$gte", low)
+            high = condition.get("$lte", high)
+        elif condition is not None:
+            low = high = condition
+    return low, high
+
+
+class ShardedCollection:
+    """The subset of the Chroma collection API the ingester and the service use, over shards.
+
+    ``open_shard(client, name, create_metadata)`` gets or creates one shard
+    collection (``collection_settings.open_collection``).
+    """
+
+    def __init__(self, client, name: str, open_shard: Callable, create_metadata: Optional[dict] = None,
+                 shard_by: str = SHARD_BY, shard_count: int = SHARD_COUNT, year_span: int = SHARD_YEAR_SPAN):
+        if shard_by not in ("hash", "year"):
+            raise ValueError(f"Unknown shard layout {shard_by!r}, expected 'none', 'hash' or 'year'")
+        self.client = client
+        self.name = name
+        self.open_shard = open_shard
+        self.create_metadata = create_metadata or {}
+        self.shard_by = shard_by
+        self.shard_count = shard_count
+        self.year_span = year_span
+        self.shards: Dict[str, object] = {}
+        self.refresh()
+        self._pool = ThreadPoolExecutor(max_workers=SHARD_SEARCH_THREADS)
+
+    def refresh(self):
+        """Re-list the shards, for ones another process created, dropped or rebuilt since."""
+        prefix = f"{self.name}__"
+        shards = {}
+        for collection in self.client.list_collections():
+            if collection.name.startswith(prefix):
+                key = collection.name[len(prefix):]
+                current = self.shards.get(key)
+                # A rebuilt shard is a new collection under the old name
+                if current is None or current.id != collection.id:
+                    current = self.open_shard(self.client, collection.name)
+                shards[key] = current
+        # Swapped in whole; queries on other threads keep the dict they started with
+        self.shards = shards
+
+    def shard_key(self, chunk_id: str, metadata: Optional[dict] = None) -> str:
+        if self.shard_by == "hash":
+            return f"h{zlib.crc32(source_file_of(chunk_id).encode('utf-8')) % self.shard_count:02d}"
+        year = (metadata or {}).get("DecisionYear")
+        return f"y{year - year % self.year_span}" if year else "yunknown"
+
+    def shard(self, key: str):
+        """The shard collection for ``key``, created with the shared settings on first use."""
+        if key not in self.shards:
+            self.shards[key] = self.open_shard(self.client, f"{self.name}__{key}", self.create_metadata)
+        return self.shards[key]
+
+    def drop_shard(self, key: str) -> List[str]:
+        """Delete one shard and return the ids of the chunks it held."""
+        shard = self.shards.pop(key, None)
+        if shard is None:
+            return []
+        ids = shard.get(include=[])["ids"]
+        self.client.delete_collection(f"{self.name}__{key}")
+        return ids
+
+    @property
+    def metadata(self) -> dict:
+        # All shards are created with the same settings
+        for shard in self.shards.values():
+            return shard.metadata
+        return dict(self.create_metadata)
+
+    def modify(self, metadata: dict):
+        self.create_metadata = {**self.create_metadata, **metadata}
+        for shard in self.shards.values():
+            shard.modify(metadata=metadata)
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+
+    def persist(self):
+        for shard in self.shards.values():
+            shard.persist()
+
+    def _group(self, ids: list, metadatas: Optional[list] = None) -> Dict[str, List[int]]:
+        groups = {}
+        for i, chunk_id in enumerate(ids):
+            groups.setdefault(self.shard_key(chunk_id, metadatas[i] if metadatas else None), []).append(i)
+        return groups
+
+    def upsert(self, ids: list, embeddings: list, metadatas: list, documents: list):
+        for key, rows in self._group(ids, metadatas).items():
+            self.shard(key).upsert(
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                documents=[documents[i] for i in rows],
+            )
+
+    def _shards_holding(self, ids: list) -> Dict[str, list]:
+        """Shard key -> the ids to look for there; year shards cannot be told from the id."""
+        if self.shard_by == "hash":
+            return {key: [ids[i] for i in rows] for key, rows in self._group(ids).items() if key in self.shards}
+        return {key: ids for key in self.shards}
+
+    def delete(self, ids: list):
+        for key, shard_ids in self._shards_holding(ids).items():
+            self.shards[key].delete(ids=shard_ids)
+
+    def get(self, ids: Optional[list] = None, limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Optional[list] = None) -> dict:
+        include = ["metadatas", "documents"] if include is None else include
+        merged = {"ids": [], **{key: [] for key in include}}
+
+        def extend(result):
+            for key in merged:
+                merged[key].extend(result[key])
+
+        if ids is not None:
+            for key, shard_ids in self._shards_holding(ids).items():
+                extend(self.shards[key].get(ids=shard_ids, include=include))
+            return merged
+
+        # Page through the shards in a fixed order, as if they were one collection
+        skip, remaining = offset or 0, limit
+        for key in sorted(self.shards):
+            if remaining is not None and remaining <= 0:
+                break
+            shard = self.shards[key]
+            size = shard.count()
+            if skip >= size:
+                skip -= size
+                continue
+            take = size - skip if remaining is None else min(remaining, size - skip)
+            extend(shard.get(limit=take, offset=skip, include=include))
+            skip = 0
+            if remaining is not None:
+                remaining -= take
+        return merged
+
+    def _shards_for(self, where: Optional[dict]) -> list:
+        """Non-empty shards that can hold matches for ``where``."""
+        shards = self.shards
+        keys = list(shards)
+        if self.shard_by == "year":
+            low, high = _year_bounds(where)
+            if low is not None or high is not None:
+                keys = [key for key in keys if key != "yunknown"
+                        and (low is None or int(key[1:]) + self.year_span - 1 >= low)
+                        and (high is None or int(key[1:]) <= high)]
+        return [(shards[key], count) for key in keys for count in [shards[key].count()] if count]
+
+    def _query_shards(self, query_embeddings: list, n_results: int, where: Optional[dict], include: list) -> list:
+        kwargs = {"where": where} if where else {}
+        futures = [
+            self._pool.submit(shard.query, query_embeddings=query_embeddings, n_results=min(n_results, count),
+                              include=include, **kwargs)
+            for shard, count in self._shards_for(where)
+        ]
+        return [future.result() for future in futures]
+
+    def query(self, query_embeddings: list, n_results: int = 10, where: Optional[dict] = None,
+              include: Optional[list] = None) -> dict:
+        """Query every relevant shard in parallel and merge the per-shard top lists by distance."""
+        include = list(DEFAULT_INCLUDE if include is None else include)
+        if "distances" not in include:
+            include.append("distances")
+        try:
+            partials = self._query_shards(query_embeddings, n_results, where, include)
+        except Exception:
+            # A shard dropped by another process fails the lookup; re-list and retry once
+            self.refresh()
+            partials = self._query_shards(query_embeddings, n_results, where, include)
+
+        merged = {"ids": [], **{key: [] for key in include}}
+        for q in range(len(query_embeddings)):
+            rows = [(distance, part, i) for part in partials for i, distance in enumerate(part["distances"][q])]
+            rows.sort(key=lambda row: row[0])
+            for key in merged:
+                merged[key].append([part[key][q][i] for _, part, i in rows[:n_results]])
+        return merged
+
+
+def open_chunk_collection(client, name: str, open_collection: Callable, create_metadata: Optional[dict] = None,
+                          shard_by: str = SHARD_BY):
+    """The chunk store: a plain collection, or a ``ShardedCollection`` per ``SHARD_BY``.
+
+    The opener is passed in because this module is imported both by the
+    flat-import database/ scripts and as ``database.sharded_collection``.
+    """
+    if shard_by == "none":
+        return open_collection(client, name, create_metadata)
+    return ShardedCollection(client, name, open_collection, create_metadata, shard_by)
@@ -0,0 +1,38 @@
+"""Repair of UTF-8 text that was decoded as latin-1 (mojibake).
+
+Applied once when chunks and case metadata are written, instead of on every
+query. Collections whose stored text has been repaired carry
+``TEXT_REPAIRED_KEY`` in their metadata; ``repair_collection.py`` migrates
+collections ingested before that.
+"""
+
+TEXT_REPAIRED_KEY = "text_repaired"
+
+
+def fix_mojibake(text):
+    """Attempt to fix common UTF-8 mis-encoding issues (mojibake)."""
+    if not isinstance(text, str):
+        return text
+    try:
+        # This sequence can repair strings that were encoded in UTF-8
+        # but were incorrectly read as latin-1 or a similar single-byte encoding.
+        # e.g., "Fenoscadiaâ\x80\x99s" -> "Fenoscadia's"
+        return text.encode('latin1').decode('utf-8')
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        # The string is likely already correctly encoded or in a different format.
+        return text
+
+
+def repair_value(value):
+    """``fix_mojibake`` applied to every string in a (nested) dict or list."""
+    if isinstance(value, str):
+        return fix_mojibake(value)
+    if isinstance(value, list):
+        return [repair_value(item) for item in value]
+    if isinstance(value, dict):
+        return {key: repair_value(item) for key, item in value.items()}
+    return value
+
+
+def is_repaired(collection) -> bool:
+    return bool((collection.metadata or {}).get(TEXT_REPAIRED_KEY))
@@ -1,12 +1,15 @@
 from datetime import datetime, date
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import re
 import html
 import unicodedata
+import uuid
+import json
 
 # Import generated models
-from models import Argument, CaseReference, AnalysisResponse, AddCaseRequest, GenDraftRequest, GenDraftResponse
+from models import Argument, CaseReference, AnalysisResponse, AddCaseRequest, AddCasesRequest, AddCasesResponse, GenDraftRequest, GenDraftResponse
 
 # Import services
 from services.embedding_service import EmbeddingService
@@ -20,9 +23,13 @@ api_router = APIRouter(prefix="/api/v1", tags=["API"])
 
 # Initialize services
 embedding_service = EmbeddingService()
-document_service = DocumentService()
+# One response cache and one Gemini concurrency limit, covering both services
+document_service = DocumentService(embedding_service.llm_cache, embedding_service.llm_slots)
 case_storage = CaseStorage()
 
+# Most prompts accepted by one /add_cases call
+MAX_BATCH_ITEMS = 50
+
 def sanitize_text(text: str) -> str:
     """
     Sanitizes text by removing or replacing problematic characters and sequences.
@@ -36,13 +43,8 @@ def sanitize_text(text: str) -> str:
     if not text or not isinstance(text, str):
         return ""
     
-    # Attempt to fix common UTF-8 mis-encoding issues (mojibake)
-    try:
-        # This can fix strings like "Fenoscadiaâ\x80\x99s" back to "Fenoscadia's"
-        text = text.encode('latin1').decode('utf-8')
-    except (UnicodeEncodeError, UnicodeDecodeError):
-        # This will fail if the string is already valid, which is fine.
-        pass
+    # Mojibake is already repaired at ingest (or by EmbeddingService for
+    # collections that predate that), so it is not attempted again here
     
     # Decode HTML entities
     text = html.unescape(text)
@@ -82,145 +84,212 @@ def sanitize_text(text: str) -> str:
     
     return text
 
-@api_router.post("/add_case", response_model=AnalysisResponse)
-async def add_case(request: AddCaseRequest):
-    """Add a new case with user prompt analysis using semantic search"""
-    if not request.user_prompt or len(request.user_prompt.strip()) == 0:
+def convert_to_arguments(analysis_list):
+    """Converts a list of dicts into a list of Argument Pydantic models."""
+    if not analysis_list:
+        return []
+
+    output_args = []
+    for item in analysis_list:
+        case_refs = []
+        for ref_data in item.get("case_references", []):
+            meta = ref_data.get("metadata", {})
+            full_case_data = meta.get("full_case_data", {})
+
+            # Extract basic metadata
+            case_identifier = sanitize_text(meta.get("Identifier") or meta.get("case_id") or meta.get("source_file") or "N/A")
+            title = sanitize_text(meta.get("Title") or meta.get("title") or meta.get("source_file") or "Unknown Title")
+            decision_date = meta.get("DecisionDate") or meta.get("date")
+            sourcefile_raw_md = sanitize_text(meta.get("source_file") or meta.get("file_path") or "N/A")
+
+            # Extract additional case details from full_case_data
+            case_number = sanitize_text(full_case_data.get("CaseNumber") or meta.get("CaseNumber") or "N/A")
+            industries = full_case_data.get("Industries") or []
+            status = sanitize_text(full_case_data.get("Status") or meta.get("Status") or "N/A")
+            party_nationalities = full_case_data.get("PartyNationalities") or []
+            institution = sanitize_text(full_case_data.get("Institution") or meta.get("Institution") or "N/A")
+            rules_of_arbitration = full_case_data.get("RulesOfArbitration") or []
+            applicable_treaties = full_case_data.get("ApplicableTreaties") or []
+            decisions = full_case_data.get("Decisions") or []
+
+            # Sanitize lists
+            if isinstance(industries, list):
+                industries = [sanitize_text(str(item)) for item in industries if item]
+            if isinstance(party_nationalities, list):
+                party_nationalities = [sanitize_text(str(item)) for item in party_nationalities if item]
+            if isinstance(rules_of_arbitration, list):
+                rules_of_arbitration = [sanitize_text(str(item)) for item in rules_of_arbitration if item]
+            if isinstance(applicable_treaties, list):
+                applicable_treaties = [sanitize_text(str(item)) for item in applicable_treaties if item]
+
+            parsed_date = None
+            if decision_date:
+                try:
+                    # Sanitize the date string before parsing
+                    clean_date = sanitize_text(decision_date)
+                    parsed_date = date.fromisoformat(clean_date[:10])
+                except Exception:
+                    parsed_date = None
+
+            case_refs.append(CaseReference(
+                caseIdentifier=case_identifier,
+                title=title,
+                Date=parsed_date,
+                matchingDegree=1 - ref_data.get("distance", 1.0),
+                sourcefile_raw_md=sourcefile_raw_md,
+                # Additional case details
+                caseNumber=case_number,
+                industries=industries,
+                status=status,
+                partyNationalities=party_nationalities,
+                institution=institution,
+                rulesOfArbitration=rules_of_arbitration,
+                applicableTreaties=applicable_treaties,
+                decisions=decisions
+            ))
+        output_args.append(Argument(
+            argument=sanitize_text(item.get("argument", "No argument provided.")),
+            case_references=case_refs
+        ))
+    return output_args
+
+def store_analysis(case_id: str, structured_analysis: dict) -> AnalysisResponse:
+    """Build the AnalysisResponse for a search result and store it under ``case_id``."""
+    response = AnalysisResponse(
+        caseId=case_id,
+        strengths=convert_to_arguments(structured_analysis.get("strengths")),
+        weaknesses=convert_to_arguments(structured_analysis.get("weaknesses"))
+    )
+    
+    # Store the response
+    case_storage.store_response(case_id, response.dict())
+    
+    return response
+
+def validate_prompt(user_prompt: str) -> None:
+    if not user_prompt or len(user_prompt.strip()) == 0:
         raise HTTPException(status_code=400, detail="User prompt cannot be empty")
     
-    if len(request.user_prompt) > 1000:
+    if len(user_prompt) > 1000:
         raise HTTPException(status_code=400, detail="User prompt too long (max 1000 characters)")
+
+def new_case_id() -> str:
+    return f"CASE-{uuid.uuid4().hex[:8].upper()}"
+
+def build_search_query(request: AddCaseRequest) -> dict:
+    """Search arguments for a request.
+
+    Fields the request leaves unset are filled from the metadata extracted
+    from the prompt, which runs alongside the vector search.
+    """
+    query = {
+        "user_prompt": request.user_prompt,
+        "claimant": request.claimant,
+        "respondent": request.respondent,
+        "case_year": request.case_year,
+        "filters": {
+            "year_from": request.year_from,
+            "year_to": request.year_to,
+            "institution": request.institution,
+            "nationality": request.nationality,
+            "treaty": request.treaty,
+            "rules_of_arbitration": request.rules_of_arbitration,
+        },
+    }
+    query["metadata"] = embedding_service.extract_metadata_from_prompt(
+        request.user_prompt, request.claimant, request.respondent, request.case_year)
+    return query
+
+@api_router.post("/add_case", response_model=AnalysisResponse)
+async def add_case(request: AddCaseRequest):
+    """Add a new case with user prompt analysis using semantic search"""
+    validate_prompt(request.user_prompt)
     
     try:
         # Generate a case ID
-        import uuid
-        case_id = f"CASE-{uuid.uuid4().hex[:8].upper()}"
+        case_id = new_case_id()
         
-        # Extract metadata from the user's prompt
-        extracted_metadata = embedding_service.extract_metadata_from_prompt(request.user_prompt)
-
-        # Use the explicit fields if provided, otherwise use the extracted metadata
-        claimant = request.claimant or extracted_metadata.get("claimant")
-        respondent = request.respondent or extracted_metadata.get("respondent")
-        case_year = request.case_year or extracted_metadata.get("case_year")
-        
-        # Use the embedding service to find and analyze similar cases
-        structured_analysis = embedding_service.search_similar_cases(
-            user_prompt=request.user_prompt, 
-            top_k=15,
-            claimant=claimant,
-            respondent=respondent,
-            case_year=case_year
-        )
-        
-        def convert_to_arguments(analysis_list):
-            """Converts a list of dicts into a list of Argument Pydantic models."""
-            if not analysis_list:
-                return []
-            
-            output_args = []
-            for item in analysis_list:
-                case_refs = []
-                for ref_data in item.get("case_references", []):
-                    meta = ref_data.get("metadata", {})
-                    full_case_data = meta.get("full_case_data", {})
-                    
-                    # Extract basic metadata
-                    case_identifier = sanitize_text(meta.get("Identifier") or meta.get("case_id") or meta.get("source_file") or "N/A")
-                    title = sanitize_text(meta.get("Title") or meta.get("title") or meta.get("source_file") or "Unknown Title")
-                    decision_date = meta.get("DecisionDate") or meta.get("date")
-                    sourcefile_raw_md = sanitize_text(meta.get("source_file") or meta.get("file_path") or "N/A")
-                    
-                    # Extract additional case details from full_case_data
-                    case_number = sanitize_text(full_case_data.get("CaseNumber") or meta.get("CaseNumber") or "N/A")
-                    industries = full_case_data.get("Industries") or []
-                    status = sanitize_text(full_case_data.get("Status") or meta.get("Status") or "N/A")
-                    party_nationalities = full_case_data.get("PartyNationalities") or []
-                    institution = sanitize_text(full_case_data.get("Institution") or meta.get("Institution") or "N/A")
-                    rules_of_arbitration = full_case_data.get("RulesOfArbitration") or []
-                    applicable_treaties = full_case_data.get("ApplicableTreaties") or []
-                    decisions = full_case_data.get("Decisions") or []
-                    
-                    # Sanitize lists
-                    if isinstance(industries, list):
-                        industries = [sanitize_text(str(item)) for item in industries if item]
-                    if isinstance(party_nationalities, list):
-                        party_nationalities = [sanitize_text(str(item)) for item in party_nationalities if item]
-                    if isinstance(rules_of_arbitration, list):
-                        rules_of_arbitration = [sanitize_text(str(item)) for item in rules_of_arbitration if item]
-                    if isinstance(applicable_treaties, list):
-                        applicable_treaties = [sanitize_text(str(item)) for item in applicable_treaties if item]
-                    
-                    parsed_date = None
-                    if decision_date:
-                        try:
-                            # Sanitize the date string before parsing
-                            clean_date = sanitize_text(decision_date)
-                            parsed_date = date.fromisoformat(clean_date[:10])
-                        except Exception:
-                            parsed_date = None
-                    
-                    case_refs.append(CaseReference(
-                        caseIdentifier=case_identifier,
-                        title=title,
-                        Date=parsed_date,
-                        matchingDegree=1 - ref_data.get("distance", 1.0),
-                        sourcefile_raw_md=sourcefile_raw_md,
-                        # Additional case details
-                        caseNumber=case_number,
-                        industries=industries,
-                        status=status,
-                        partyNationalities=party_nationalities,
-                        institution=institution,
-                        rulesOfArbitration=rules_of_arbitration,
-                        applicableTreaties=applicable_treaties,
-                        decisions=decisions
-                    ))
-                output_args.append(Argument(
-                    argument=sanitize_text(item.get("argument", "No argument provided.")),
-                    case_references=case_refs
-                ))
-            return output_args
-
-        strengths = convert_to_arguments(structured_analysis.get("strengths"))
-        weaknesses = convert_to_arguments(structured_analysis.get("weaknesses"))
+        # Find and analyze similar cases; metadata extraction from the
+        # prompt overlaps with the semantic search
+        query = build_search_query(request)
+        structured_analysis = await embedding_service.search_similar_cases(top_k=15, **query)
         
-        response = AnalysisResponse(
-            caseId=case_id,
-            strengths=strengths,
-            weaknesses=weaknesses
-        )
+        return store_analysis(case_id, structured_analysis)
         
-        # Store the response
-        case_storage.store_response(case_id, response.dict())
+    except Exception as e:
+        print(f"Error in add_case: {e}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@api_router.post("/add_cases", response_model=AddCasesResponse)
+async def add_cases(request: AddCasesRequest):
+    """Analyze a batch of user prompts; one AnalysisResponse per item, in order"""
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch cannot be empty")
+    
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_BATCH_ITEMS} items)")
+    
+    for item in request.items:
+        validate_prompt(item.user_prompt)
+    
+    try:
+        # One embedding batch and one vector query for the whole request,
+        # while the per-prompt metadata extractions run
+        queries = [build_search_query(item) for item in request.items]
+        analyses = await embedding_service.search_similar_cases_batch(queries, top_k=15)
         
-        return response
+        return AddCasesResponse(results=[store_analysis(new_case_id(), analysis) for analysis in analyses])
         
     except Exception as e:
-        print(f"Error in add_case: {e}")
+        print(f"Error in add_cases: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+def load_analysis(case_id: str) -> AnalysisResponse:
+    """The stored analysis of ``case_id``; 400/404 if it is missing."""
+    if not case_id:
+        raise HTTPException(status_code=400, detail="case_id is required")
+    
+    case_response = case_storage.get_response(case_id)
+    if case_response is None:
+        raise HTTPException(status_code=404, detail=f"Case with ID {case_id} not found")
+    
+    return AnalysisResponse(**case_response)
+
 @api_router.get("/gen_draft", response_model=GenDraftResponse)
 async def gen_draft(case_id: str):
     """Generate a legal draft for a case"""
     try:
-        if not case_id:
-            raise HTTPException(status_code=400, detail="case_id is required")
-        
-        # Try to retrieve the case response
-        case_response = case_storage.get_response(case_id)
-        if case_response is None:
-            raise HTTPException(status_code=404, detail=f"Case with ID {case_id} not found")
-        
-        # Convert the stored response back to an AnalysisResponse model
-        analysis = AnalysisResponse(**case_response)
+        analysis = load_analysis(case_id)
         
         # Generate the document using our new service
-        document_html = document_service.generate_draft(analysis, case_id)
+        document_html = await document_service.generate_draft(analysis, case_id)
         
         return GenDraftResponse(text=document_html)
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error in gen_draft: {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+@api_router.get("/gen_draft_stream")
+async def gen_draft_stream(case_id: str):
+    """Stream a legal draft for a case as Server-Sent Events"""
+    # Resolved before the stream starts, so a missing case is still a plain 404
+    analysis = load_analysis(case_id)
+    
+    async def events():
+        async for event, data in document_service.stream_draft(analysis, case_id):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    # No proxy buffering, so every event reaches the client as it is sent
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.get("/stats")
+def stats():
+    """Size and hit rate of the in-process caches (sync, so FastAPI runs the SQLite count in a thread)"""
+    return {
+        "case_file_cache": embedding_service.case_files.stats(),
+        "llm_cache": embedding_service.llm_cache.stats(),
+        "prompt_extraction": embedding_service.extraction_stats(),
+    }
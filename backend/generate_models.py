@@ -25,7 +25,8 @@ class SimpleOpenAPIGenerator:
         if 'properties' in schema:
             for prop_name, prop_schema in schema['properties'].items():
                 prop_type = self._get_python_type(prop_schema)
-                lines.append(f"    {prop_name}: {prop_type}")
+                default = f" = {prop_schema['default']!r}" if 'default' in prop_schema else ""
+                lines.append(f"    {prop_name}: {prop_type}{default}")
         else:
             lines.append("    pass")
         return lines
@@ -70,7 +71,8 @@ class SimpleOpenAPIGenerator:
         schemas = spec.get('components', {}).get('schemas', {})
         
         # Generate all schema models in the correct order
-        schema_order = ['CaseReference', 'Argument', 'AnalysisResponse', 'AddCaseRequest', 'HealthResponse']
+        schema_order = ['CaseReference', 'Argument', 'AnalysisResponse', 'AddCaseRequest', 'AddCasesRequest', 'AddCasesResponse',
+                        'HealthResponse']
         for name in schema_order:
             if name in schemas:
                 models_content.extend(self._generate_model_class(name, schemas[name]))
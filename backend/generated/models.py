@@ -34,6 +34,18 @@ class AddCaseRequest(BaseModel):
     claimant: Optional[str] = None
     respondent: Optional[str] = None
     case_year: Optional[int] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    institution: Optional[str] = None
+    nationality: Optional[List[str]] = None
+    treaty: Optional[List[str]] = None
+    rules_of_arbitration: Optional[List[str]] = None
+
+class AddCasesRequest(BaseModel):
+    items: List[AddCaseRequest]
+
+class AddCasesResponse(BaseModel):
+    results: List[AnalysisResponse]
 
 class HealthResponse(BaseModel):
     status: str
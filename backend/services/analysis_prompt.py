@@ -0,0 +1,121 @@
+import os
+import re
+from typing import Callable, List, Tuple
+
+# === Configuration ===
+# Tokens the case documents of one analysis prompt may take, all cases together
+ANALYSIS_TOKEN_BUDGET = int(os.environ.get("ANALYSIS_TOKEN_BUDGET", "6000"))
+# Upper bounds per case, so the best-ranked cases cannot take the whole budget
+SUMMARY_TOKEN_LIMIT = int(os.environ.get("SUMMARY_TOKEN_LIMIT", "120"))
+EXCERPT_TOKEN_LIMIT = int(os.environ.get("EXCERPT_TOKEN_LIMIT", "250"))
+CASE_SEPARATOR = "\n---\n"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {"a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+              "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "which", "with"}
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def terms(text: str) -> set:
+    return {word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def _cut_words(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """The longest word prefix of ``text`` within ``max_tokens``."""
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(" ".join(words[:mid])) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return " ".join(words[:low])
+
+
+def fit_sentences(sentences: List[str], scores: List[float], max_tokens: int,
+                  count_tokens: Callable[[str], int]) -> str:
+    """The best-scoring sentence grown with its neighbours while ``max_tokens`` allows.
+
+    Ties go to the earliest sentence. Cuts are marked with "...".
+    """
+    if not sentences or max_tokens <= 0:
+        return ""
+    best = max(range(len(sentences)), key=lambda i: (scores[i], -i))
+    lengths = [count_tokens(sentence) for sentence in sentences]
+    if lengths[best] > max_tokens:
+        cut = _cut_words(sentences[best], max_tokens - 1, count_tokens)
+        return f"{cut} ..." if cut else ""
+
+    start, end, used = best, best + 1, lengths[best]
+    grown = True
+    while grown:
+        grown = False
+        # Following context first, then what leads up to the sentence
+        if end < len(sentences) and used + lengths[end] <= max_tokens:
+            used += lengths[end]
+            end += 1
+            grown = True
+        if start > 0 and used + lengths[start - 1] <= max_tokens:
+            start -= 1
+            used += lengths[start]
+            grown = True
+
+    text = " ".join(sentences[start:end])
+    return ("... " if start > 0 else "") + text + (" ..." if end < len(sentences) else "")
+
+
+def case_header(meta: dict) -> str:
+    source_file = meta.get('source_file', 'N/A')
+    title = meta.get('Title') or meta.get('title') or source_file
+    header = f"Title: {title}\nSource File: {source_file}\n"
+    for label, field in (("Status", "Status"), ("Decision Type", "DecisionType"), ("Institution", "Institution")):
+        if meta.get(field):
+            header += f"{label}: {meta[field]}\n"
+    return header
+
+
+def build_cases_text(cases: list, query: str, count_tokens: Callable[[str], int],
+                     budget: int = ANALYSIS_TOKEN_BUDGET) -> Tuple[str, int]:
+    """The case documents section of the analysis prompt, within ``budget`` tokens.
+
+    ``cases`` are taken in rank order while the budget lasts; a case that
+    does not fit is skipped, not the end of the list. Summaries
+    keep their leading sentences; excerpts are cut around the sentences
+    sharing the most terms with ``query``. Returns the text and how many
+    cases it holds.
+    """
+    query_terms = terms(query)
+    separator_tokens = count_tokens(CASE_SEPARATOR)
+    parts, used = [], 0
+    for case in cases:
+        if used >= budget:
+            break
+        meta = case['metadata']
+        case_text = case_header(meta)
+        remaining = budget - used - count_tokens(case_text) - (separator_tokens if parts else 0)
+
+        full_data = meta.get('full_case_data', {})
+        summary = split_sentences(full_data.get('summary') or full_data.get('headnote') or '')
+        if summary:
+            summary_text = fit_sentences(summary, [0] * len(summary), min(SUMMARY_TOKEN_LIMIT, remaining - 2),
+                                         count_tokens)
+            if summary_text:
+                case_text += f"Summary: {summary_text}\n"
+                remaining -= count_tokens(f"Summary: {summary_text}\n")
+
+        excerpt = split_sentences(case['document'])
+        scores = [len(query_terms & terms(sentence)) for sentence in excerpt]
+        excerpt_text = fit_sentences(excerpt, scores, min(EXCERPT_TOKEN_LIMIT, remaining - 4), count_tokens)
+        if not excerpt_text:
+            # A later case with a shorter header or excerpt may still fit
+            continue
+        case_text += f"Relevant Excerpt: {excerpt_text}"
+
+        used += count_tokens(case_text) + (separator_tokens if parts else 0)
+        parts.append(case_text)
+    return CASE_SEPARATOR.join(parts), len(parts)
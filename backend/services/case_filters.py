@@ -0,0 +1,82 @@
+from typing import Dict, Iterable, Optional, Set
+
+# Filter name -> case table field it is matched against
+CASE_FILTER_FIELDS = {
+    "institution": "Institution",
+    "nationality": "PartyNationalities",
+    "treaty": "ApplicableTreaties",
+    "rules_of_arbitration": "RulesOfArbitration",
+}
+YEAR_FILTERS = ("year_from", "year_to")
+
+
+def _terms(value) -> Iterable[str]:
+    """Index terms of a case field; list fields were stored joined with ", "."""
+    if not value:
+        return []
+    return [term.strip().lower() for term in str(value).split(", ") if term.strip()]
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, (list, tuple, set)) else [value]
+
+
+class CaseTermIndex:
+    """Inverted indexes from case-level field terms to case keys.
+
+    Built from the case table the ingester writes, so filtering on
+    institution, nationality, treaty or rules touches only the postings of
+    the requested terms, never the chunks.
+    """
+
+    def __init__(self, case_metadata: Dict[str, dict]):
+        self.postings: Dict[str, Dict[str, Set[str]]] = {field: {} for field in CASE_FILTER_FIELDS.values()}
+        for case_key, meta in case_metadata.items():
+            for field, postings in self.postings.items():
+                for term in _terms(meta.get(field)):
+                    postings.setdefault(term, set()).add(case_key)
+
+    def matching_cases(self, filters: dict) -> Optional[Set[str]]:
+        """Case keys passing every case-level filter, or None if none was given.
+
+        A filter value may be a string or a list of strings; any of them
+        matches (case-insensitively, on whole terms). Different filters must
+        all match.
+        """
+        matched = None
+        for name, field in CASE_FILTER_FIELDS.items():
+            if not filters.get(name):
+                continue
+            cases = set()
+            for value in _as_list(filters[name]):
+                cases |= self.postings[field].get(str(value).strip().lower(), set())
+            matched = cases if matched is None else matched & cases
+        return matched
+
+
+def build_where(filters: Optional[dict], term_index: CaseTermIndex) -> Optional[dict]:
+    """Translate search filters into a chunk-level ``where`` clause.
+
+    Returns None when nothing is filtered, and raises ``LookupError`` when
+    no case can match, so the caller can skip the vector search entirely.
+    """
+    unknown = set(filters or {}) - set(CASE_FILTER_FIELDS) - set(YEAR_FILTERS)
+    if unknown:
+        raise ValueError(f"Unknown search filters: {sorted(unknown)}")
+    if not filters:
+        return None
+
+    clauses = []
+    cases = term_index.matching_cases(filters)
+    if cases is not None:
+        if not cases:
+            raise LookupError("No case matches the filters")
+        clauses.append({"case_key": {"$in": sorted(cases)}})
+    if filters.get("year_from") is not None:
+        clauses.append({"DecisionYear": {"$gte": int(filters["year_from"])}})
+    if filters.get("year_to") is not None:
+        clauses.append({"DecisionYear": {"$lte": int(filters["year_to"])}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
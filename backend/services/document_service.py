@@ -1,55 +1,113 @@
 import os
+import asyncio
 import google.generativeai as genai
 from dotenv import load_dotenv
+import re
 from datetime import date
-import json
+
+from database.llm_cache import LLMResponseCache, parse_json_response
 
 # Load environment variables from .env file
 load_dotenv()
 
-class DocumentService:
+# Gemini calls in flight at once when no limit is shared in (see EmbeddingService)
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))
+
+# Section markers of the streamed draft -> template field they fill
+STREAM_SECTIONS = {
+    "CLAIMANTS": "claimants",
+    "RESPONDENTS": "respondents",
+    "TITLE": "title",
+    "INTRO": "intro_statement",
+    "BODY": "body",
+}
+_MARKER = re.compile(r"^[ \t]*===([A-Z]+)===[ \t]*$", re.MULTILINE)
+# A body block is complete once its closing tag has arrived
+_BLOCK_END = re.compile(r"</(?:p|h\d|ul|ol|blockquote)>", re.IGNORECASE)
+# Markdown code fence lines Gemini sometimes wraps the draft in; a fence is
+# only dropped once its line has ended, except at the end of the stream
+_FENCE = re.compile(r"^[ \t]*```[\w-]*[ \t]*\n", re.MULTILINE)
+_LAST_FENCE = re.compile(r"^[ \t]*```[\w-]*[ \t]*\Z", re.MULTILINE)
+
+
+class DraftStreamParser:
+    """Turns the streamed ``===SECTION===`` draft into ``section`` and ``body`` events."""
+
     def __init__(self):
+        self.text = ""
+        self.sections = {}
+        self.complete = False
+        self._pending = ""
+        self._field = None
+        self._body_sent = 0
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        self._pending = _FENCE.sub("", self._pending + chunk)
+        events = []
+        while True:
+            marker = _MARKER.search(self._pending)
+            # A marker is only certain once its line has ended
+            if marker is None or marker.end() == len(self._pending):
+                break
+            events += self._finish(self._pending[:marker.start()])
+            self._field = STREAM_SECTIONS.get(marker.group(1))
+            self._pending = self._pending[marker.end():]
+            self._body_sent = 0
+        if self._field == "body":
+            events += self._flush_body(self._pending, final=False)
+        return events
+
+    def close(self) -> list:
+        events = self._finish(_LAST_FENCE.sub("", self._pending))
+        self._pending = ""
+        self.complete = "body" in self.sections
+        return events
+
+    def _finish(self, text: str) -> list:
+        """End the current section with ``text`` as the rest of its content."""
+        if self._field is None:
+            return []
+        if self._field == "body":
+            events = self._flush_body(text, final=True)
+            self.sections["body"] = text.strip()
+            return events
+        self.sections[self._field] = text.strip()
+        return [("section", {"slot": self._field, "html": self.sections[self._field]})]
+
+    def _flush_body(self, text: str, final: bool) -> list:
+        """Send the body blocks of ``text`` not sent yet; all of it once the body is final."""
+        end = len(text) if final else max((m.end() for m in _BLOCK_END.finditer(text, self._body_sent)), default=0)
+        if end <= self._body_sent or not text[self._body_sent:end].strip():
+            return []
+        html = text[self._body_sent:end].strip()
+        self._body_sent = end
+        return [("body", {"html": html})]
+
+class DocumentService:
+    def __init__(self, llm_cache: LLMResponseCache = None, llm_slots: asyncio.Semaphore = None):
         """Initialize document service and configure Gemini"""
         try:
             genai.configure(api_key=os.environ["GEMINI_API_KEY"])
             self.gen_model = genai.GenerativeModel('gemini-1.5-pro')
         except Exception as e:
             raise RuntimeError("GEMINI_API_KEY environment variable not set.") from e
+        # Drafts for an analysis that was drafted before come from the cache
+        self.llm_cache = llm_cache or LLMResponseCache()
+        # Gemini calls in flight, shared with EmbeddingService so LLM_CONCURRENCY bounds both
+        self.llm_slots = llm_slots or asyncio.Semaphore(LLM_CONCURRENCY)
 
-    def generate_draft(self, analysis_response, case_id):
+    async def generate_draft(self, analysis_response, case_id):
         """Generate a legal draft using Gemini based on the analysis results"""
         
-        # Extract arguments and references
-        strengths = analysis_response.strengths
-        weaknesses = analysis_response.weaknesses
-
-        # Prepare case references and arguments for Gemini
-        strength_texts = []
-        for arg in strengths:
-            refs = [f"{ref.title} ({ref.caseIdentifier})" for ref in arg.case_references]
-            strength_texts.append({
-                'argument': arg.argument,
-                'references': refs
-            })
-
-        weakness_texts = []
-        for arg in weaknesses:
-            refs = [f"{ref.title} ({ref.caseIdentifier})" for ref in arg.case_references]
-            weakness_texts.append({
-                'argument': arg.argument,
-                'references': refs
-            })
+        arguments_text = self._arguments_text(analysis_response)
 
         # Create prompt for Gemini
         prompt = f"""
 You are a legal expert tasked with drafting a formal legal document. Using the provided arguments and case references,
 generate a well-structured legal document that presents the case in a professional and compelling manner.
 
-Strengths/Arguments:
-{self._format_arguments(strength_texts)}
-
-Potential Weaknesses/Counterarguments:
-{self._format_arguments(weakness_texts)}
+{arguments_text}
 
 Generate a JSON response with the following structure:
 {{
@@ -69,10 +127,16 @@ The response should be a valid JSON object. The body should be properly formatte
 """
 
         try:
-            response = self.gen_model.generate_content(prompt)
-            # Clean up potential markdown and parse
-            cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-            content = json.loads(cleaned_response)
+            cached = await self.llm_cache.get_async(self.gen_model.model_name, prompt)
+            if cached is not None:
+                response_text = cached
+            else:
+                # Native async call, so the event loop keeps serving other requests
+                async with self.llm_slots:
+                    response_text = (await self.gen_model.generate_content_async(prompt)).text
+            content = parse_json_response(response_text)
+            if cached is None:
+                await self.llm_cache.put_async(self.gen_model.model_name, prompt, response_text)
 
             # Generate the final HTML document
             html_template = self._get_html_template()
@@ -89,6 +153,87 @@ The response should be a valid JSON object. The body should be properly formatte
             print(f"Error generating document with Gemini: {e}")
             return self._get_error_document(case_id)
 
+    async def stream_draft(self, analysis_response, case_id):
+        """Yield ``(event, data)`` pairs while Gemini writes the draft.
+
+        ``skeleton`` comes first, before the model is called: the full HTML
+        document with an empty ``<span data-slot="...">`` for each generated
+        part. Then ``section`` fills the claimants, respondents, title and
+        intro slots as each is complete. ``body`` appends blocks to the body
+        slot, each one flushed as soon as its closing tag arrives. ``done``
+        carries the finished document.
+        """
+        today = date.today().strftime("%d %B %Y")
+        yield "skeleton", {"html": self._get_html_template().format(
+            date=today, **{field: f'<span data-slot="{field}"></span>' for field in STREAM_SECTIONS.values()}
+        )}
+
+        prompt = f"""
+You are a legal expert tasked with drafting a formal legal document. Using the provided arguments and case references,
+generate a well-structured legal document that presents the case in a professional and compelling manner.
+
+{self._arguments_text(analysis_response)}
+
+Write the document as the following sections, in this order. Start each section with its marker on a line of its own:
+===CLAIMANTS===
+A professional description of the claimants
+===RESPONDENTS===
+A professional description of the respondents
+===TITLE===
+An appropriate title for this legal document
+===INTRO===
+A clear introductory statement about the case
+===BODY===
+A well-structured main body that presents the arguments in a logical order, cites relevant cases appropriately,
+addresses potential counterarguments, and uses formal legal language in a professional tone throughout.
+Format the body with HTML paragraphs (<p>) and headings (<h4>).
+
+Output only the sections, without any additional text or markdown.
+"""
+        parser = DraftStreamParser()
+        cached = await self.llm_cache.get_async(self.gen_model.model_name, prompt)
+        try:
+            if cached is not None:
+                events = parser.feed(cached)
+            else:
+                # Native async streaming; each chunk is parsed as it arrives. The
+                # slot is held until the stream ends, as the call is in flight until then
+                events = []
+                async with self.llm_slots:
+                    response = await self.gen_model.generate_content_async(prompt, stream=True)
+                    async for chunk in response:
+                        for event in parser.feed(chunk.text):
+                            yield event
+            for event in events + parser.close():
+                yield event
+        except Exception as e:
+            print(f"Error streaming document with Gemini: {e}")
+            yield "done", {"html": self._get_error_document(case_id)}
+            return
+
+        if cached is None and parser.complete:
+            await self.llm_cache.put_async(self.gen_model.model_name, prompt, parser.text)
+        content = parser.sections
+        yield "done", {"html": self._get_html_template().format(
+            claimants=content.get('claimants') or f"Claimants (Case: {case_id})",
+            respondents=content.get('respondents') or "Respondents",
+            title=content.get('title') or "Legal Submission",
+            intro_statement=content.get('intro_statement', ""),
+            body=content.get('body', ""),
+            date=today
+        )}
+
+    def _arguments_text(self, analysis_response):
+        """The strengths and weaknesses of an analysis, as given to Gemini"""
+        def argument_texts(arguments):
+            return [
+                {'argument': arg.argument,
+                 'references': [f"{ref.title} ({ref.caseIdentifier})" for ref in arg.case_references]}
+                for arg in arguments
+            ]
+        return (f"Strengths/Arguments:\n{self._format_arguments(argument_texts(analysis_response.strengths))}\n\n"
+                f"Potential Weaknesses/Counterarguments:\n{self._format_arguments(argument_texts(analysis_response.weaknesses))}")
+
     def _format_arguments(self, arguments):
         """Format arguments for the prompt"""
         formatted = []
@@ -1,11 +1,28 @@
 import os
-from sentence_transformers import SentenceTransformer
+import asyncio
+import threading
 import chromadb
+from collections import Counter
 import json
 import google.generativeai as genai
 from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from transformers import AutoTokenizer
+
+from database.case_file_cache import CaseFileCache
+from database.case_table import CaseTable
+from database.collection_settings import open_collection
+from database.embedding_backend import backend_cache_name, load_embedding_model
+from database.embedding_cache import EmbeddingCache
+from database.llm_cache import LLMResponseCache, parse_json_response
+from database.rescoring import rescoring_text
+from database.sharded_collection import ShardedCollection, open_chunk_collection
+from database.text_repair import TEXT_REPAIRED_KEY, fix_mojibake, is_repaired, repair_value
+from services.analysis_prompt import ANALYSIS_TOKEN_BUDGET, build_cases_text
+from services.case_filters import CaseTermIndex, build_where
+from services.prompt_metadata import PromptMetadataExtractor
+from services.vector_index import VECTOR_INDEX, make_vector_index
 
 # Load environment variables from .env file
 load_dotenv()
@@ -15,9 +32,44 @@ load_dotenv()
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'database', 'chroma_data')
 COLLECTION_NAME = "legal_cases"
+CASE_TABLE_PATH = os.path.join(DATA_DIR, 'case_table.db')
+MANIFEST_PATH = os.path.join(DATA_DIR, 'ingest_manifest.json')
+NUMPY_INDEX_DIR = os.path.join(DATA_DIR, 'numpy_index')
+CASES_DIR = os.path.join(os.path.dirname(__file__), '..', 'database', 'cases')
+# Chunks of one case that may reach Gemini; the rest of top_k goes to other cases
+CHUNKS_PER_CASE = int(os.environ.get("CHUNKS_PER_CASE", "1"))
+# Chunks fetched per requested case, as the pool for rescoring and collapsing
+CANDIDATE_POOL_FACTOR = int(os.environ.get("CANDIDATE_POOL_FACTOR", "10"))
+# Gemini calls in flight at once, across all requests
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))
+# Threads running the CPU-bound part of a search (embedding, vector query,
+# rescoring) off the event loop
+SEARCH_THREADS = int(os.environ.get("SEARCH_THREADS", "4"))
+
+
+def collapse_by_case(scores, case_keys, top_k: int, per_case: int = CHUNKS_PER_CASE) -> np.ndarray:
+    """Indices of the ``top_k`` best candidates, keeping at most ``per_case`` per case.
+
+    Candidates are ranked by ``scores`` (higher is better); ties keep their
+    original order.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    _, groups = np.unique(np.asarray(case_keys, dtype=str), return_inverse=True)
+    order = np.argsort(-scores, kind="stable")
+    position = np.empty(len(order), dtype=np.int64)
+    position[order] = np.arange(len(order))
+
+    # Regroup by case with each case's candidates best first, then rank within the case
+    by_case = order[np.argsort(groups[order], kind="stable")]
+    starts = np.flatnonzero(np.r_[True, np.diff(groups[by_case]) != 0])
+    rank = np.arange(len(by_case)) - np.repeat(starts, np.diff(np.r_[starts, len(by_case)]))
+
+    keep = by_case[rank < per_case]
+    return keep[np.argsort(position[keep])][:top_k]
+
 
 class EmbeddingService:
-    def __init__(self):
+    def __init__(self, llm_cache: LLMResponseCache = None, llm_slots: asyncio.Semaphore = None):
         """Initialize embedding service and load models"""
         # Configure Gemini API
         try:
@@ -27,45 +79,161 @@ class EmbeddingService:
             # Handle cases where API key is not set
             raise RuntimeError("GEMINI_API_KEY environment variable not set.") from e
 
-        # Load the SentenceTransformer model
-        self.model = SentenceTransformer(MODEL_NAME)
+        # Load the embedding model (torch or ONNX, per EMBEDDING_BACKEND)
+        self.model = load_embedding_model(MODEL_NAME)
+        # Prompt sizes are counted with a tokenizer of their own: the model's
+        # fast tokenizer is not safe to share with encode() across threads
+        self._count_tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        self._count_lock = threading.Lock()
+
+        # Vectors computed at ingest time; read-only here, the ingester owns writes
+        self.embedding_cache = EmbeddingCache(backend_cache_name(MODEL_NAME), writable=False)
 
         # Initialize Chroma client and get collection
         self.client = chromadb.PersistentClient(path=DATA_DIR)
-        self.collection = self.client.get_or_create_collection(COLLECTION_NAME)
+        # One collection, or shards searched in parallel (SHARD_BY)
+        self.collection = open_chunk_collection(self.client, COLLECTION_NAME, open_collection, {TEXT_REPAIRED_KEY: 1})
+        # Whether stored text is already free of mojibake (picked up on restart)
+        self.text_repaired = is_repaired(self.collection)
+
+        # Top-k search backend: Chroma's HNSW index or exact in-process NumPy search
+        self.index = make_vector_index(self.collection, VECTOR_INDEX, NUMPY_INDEX_DIR, MANIFEST_PATH)
+
+        # Case-level metadata, joined onto chunk hits after retrieval
+        self.case_metadata = {}
+        self.case_terms = CaseTermIndex({})
+        self.prompt_extractor = PromptMetadataExtractor({})
+        self._case_table_mtime = None
+        self._load_case_table()
+        self._shards_mtime = self._manifest_mtime()
+
+        # Slim case file headers for the hits handed to Gemini
+        self.case_files = CaseFileCache(CASES_DIR)
+
+        # The async methods never block the event loop: Gemini is called
+        # natively async, and retrieval runs on a bounded thread pool
+        self.search_pool = ThreadPoolExecutor(max_workers=SEARCH_THREADS)
+        self.llm_slots = llm_slots or asyncio.Semaphore(LLM_CONCURRENCY)
+        # Answers to prompts seen before, so re-submitted requests skip Gemini
+        self.llm_cache = llm_cache or LLMResponseCache()
+        # Which tier answered each prompt metadata extraction
+        self.extraction_counts = Counter()
+        # Index and case table reloads must not race between search threads
+        self._refresh_lock = threading.Lock()
+
+    async def _generate(self, prompt: str, parse=parse_json_response):
+        """Parsed Gemini completion, with at most ``LLM_CONCURRENCY`` calls in flight.
+
+        A prompt answered before is served from the response cache; a
+        response is only cached once ``parse`` accepted it.
+        """
+        cached = await self.llm_cache.get_async(self.gen_model.model_name, prompt)
+        if cached is not None:
+            return parse(cached)
+        async with self.llm_slots:
+            response = await self.gen_model.generate_content_async(prompt)
+        result = parse(response.text)
+        await self.llm_cache.put_async(self.gen_model.model_name, prompt, response.text)
+        return result
+
+    def _encode_batch(self, texts: list) -> np.ndarray:
+        return self.model.encode(texts, show_progress_bar=False, normalize_embeddings=True)
+
+    def _count_tokens(self, text: str) -> int:
+        """Prompt size estimate with the embedding model's local tokenizer."""
+        with self._count_lock:
+            return len(self._count_tokenizer.tokenize(text))
 
     def _embed_text(self, text: str) -> list:
-        """Embed text using the SentenceTransformer model."""
-        embedding = self.model.encode(text, show_progress_bar=False, normalize_embeddings=True)
+        """Embed text using the embedding cache, falling back to the embedding model."""
+        embedding = self.embedding_cache.get(text)
+        if embedding is None:
+            embedding = self.model.encode(text, show_progress_bar=False, normalize_embeddings=True)
         return embedding.tolist()
 
-    def _fix_mojibake(self, text: str) -> str:
-        """Attempt to fix common UTF-8 mis-encoding issues (mojibake)."""
-        if not isinstance(text, str):
-            return text
+    def _embed_texts(self, texts: list) -> list:
+        """Embed many texts with one model call for all cache misses."""
+        return self.embedding_cache.encode(texts, self._encode_batch, store=False).tolist()
+
+    def _manifest_mtime(self):
         try:
-            # This sequence can repair strings that were encoded in UTF-8
-            # but were incorrectly read as latin-1 or a similar single-byte encoding.
-            # e.g., "Fenoscadiaâ\x80\x99s" -> "Fenoscadia's"
-            return text.encode('latin1').decode('utf-8')
-        except (UnicodeEncodeError, UnicodeDecodeError):
-            # The string is likely already correctly encoded or in a different format.
-            return text
+            return os.path.getmtime(MANIFEST_PATH)
+        except OSError:
+            return None
+
+    def _refresh_shards(self):
+        """Re-list the shards after an ingestion run, which may have dropped or rebuilt some."""
+        if not isinstance(self.collection, ShardedCollection):
+            return
+        mtime = self._manifest_mtime()
+        if mtime != self._shards_mtime:
+            self.collection.refresh()
+            self._shards_mtime = mtime
+
+    def _load_case_table(self):
+        """(Re)load the case table into memory if the ingester has changed it."""
+        try:
+            mtime = os.path.getmtime(CASE_TABLE_PATH)
+        except OSError:
+            return
+        if mtime == self._case_table_mtime:
+            return
+        table = CaseTable(CASE_TABLE_PATH)
+        try:
+            self.case_metadata = table.load_all()
+        finally:
+            table.close()
+        self.case_terms = CaseTermIndex(self.case_metadata)
+        self.prompt_extractor = PromptMetadataExtractor(self.case_metadata)
+        self._case_table_mtime = mtime
+
+    def _join_case_metadata(self, meta: dict) -> dict:
+        """Merge the case-level fields of a chunk's case into its metadata."""
+        case = self.case_metadata.get(meta.get("case_key"))
+        if not case:
+            return meta
+        return {**case, **meta}
 
     def _read_case_file(self, source_file: str) -> dict:
-        """Read case file content from a JSON file."""
-        base_cases_path = os.path.join(os.path.dirname(__file__), '..', 'database', 'cases')
-        full_path = os.path.join(base_cases_path, source_file)
-        if not os.path.exists(full_path):
-            return {"error": "File not found", "path": full_path}
+        """Return the header fields of a case file, without the decision texts."""
+        full_path = os.path.join(CASES_DIR, source_file)
         try:
-            # Specify UTF-8 encoding to prevent character issues
-            with open(full_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # Served from memory unless the file changed since it was last read
+            case = self.case_files.get(source_file)
         except Exception as e:
             return {"error": f"Failed to read or parse file: {e}", "path": full_path}
+        if case is None:
+            return {"error": "File not found", "path": full_path}
+        return case
+
+    async def extract_metadata_from_prompt(self, user_prompt: str, claimant: str = None, respondent: str = None,
+                                           case_year: int = None) -> dict:
+        """Claimant, respondent and year of the case a prompt is about.
+
+        Values given by the request win. The rest comes from the local
+        extractor when it is confident, and from Gemini otherwise.
+        """
+        given = {"claimant": claimant, "respondent": respondent, "case_year": case_year}
+        if all(given.values()):
+            self.extraction_counts["request"] += 1
+            return given
+        local, confident = self.prompt_extractor.extract(user_prompt, given)
+        if confident:
+            self.extraction_counts["local"] += 1
+            return local
+        self.extraction_counts["llm"] += 1
+        extracted = await self._extract_metadata_with_gemini(user_prompt)
+        return {field: given[field] or extracted[field] or local[field] for field in given}
+
+    def extraction_stats(self) -> dict:
+        """How many metadata extractions each tier answered, and the Gemini calls avoided."""
+        total = sum(self.extraction_counts.values())
+        return {
+            **{tier: self.extraction_counts[tier] for tier in ("request", "local", "llm")},
+            "llm_calls_avoided": total - self.extraction_counts["llm"],
+        }
 
-    def extract_metadata_from_prompt(self, user_prompt: str) -> dict:
+    async def _extract_metadata_with_gemini(self, user_prompt: str) -> dict:
         """Extracts claimant, respondent, and year from a user prompt using Gemini."""
         prompt = f"""
 From the following text, extract the claimant, the respondent, and the year of the case. 
@@ -77,10 +245,7 @@ Text: "{user_prompt}"
 JSON:
 """
         try:
-            response = self.gen_model.generate_content(prompt)
-            # Clean up potential markdown and parse
-            cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-            metadata = json.loads(cleaned_response)
+            metadata = await self._generate(prompt)
             return {
                 "claimant": metadata.get("claimant"),
                 "respondent": metadata.get("respondent"),
@@ -90,33 +255,13 @@ JSON:
             print(f"Error extracting metadata from prompt: {e}")
             return {"claimant": None, "respondent": None, "case_year": None}
 
-    def _analyze_with_gemini(self, user_prompt: str, cases_data: list) -> dict:
+    async def _analyze_with_gemini(self, user_prompt: str, cases_data: list) -> dict:
         """Analyze cases with Gemini and return structured arguments."""
-        case_details = []
-        for case in cases_data:
-            meta = case['metadata']
-            source_file = meta.get('source_file', 'N/A')
-            title = meta.get('Title') or meta.get('title') or source_file
-            status = meta.get('Status', '')
-            decision_type = meta.get('DecisionType', '')
-            institution = meta.get('Institution', '')
-            full_data = meta.get('full_case_data', {})
-            summary = full_data.get('summary') or full_data.get('headnote') or ''
-            if summary:
-                summary = summary[:500] + ('...' if len(summary) > 500 else '')
-            chunk = case['document'][:1000] + ('...' if len(case['document']) > 1000 else '')
-            case_text = f"Title: {title}\nSource File: {source_file}\n"
-            if status:
-                case_text += f"Status: {status}\n"
-            if decision_type:
-                case_text += f"Decision Type: {decision_type}\n"
-            if institution:
-                case_text += f"Institution: {institution}\n"
-            if summary:
-                case_text += f"Summary: {summary}\n"
-            case_text += f"Relevant Excerpt: {chunk}"
-            case_details.append(case_text)
-        cases_text = "\n---\n".join(case_details)
+        # Ranked cases, fitted into the token budget around their best-matching
+        # sentences; tokenizing is CPU work, so it stays off the event loop
+        loop = asyncio.get_running_loop()
+        cases_text, included = await loop.run_in_executor(
+            self.search_pool, build_cases_text, cases_data, user_prompt, self._count_tokens)
         prompt = f"""
 You are a legal analysis expert. Your task is to analyze a user's legal query and a set of relevant case documents. 
 Your goal is to generate a diverse set of arguments, covering as many of the provided cases as possible.
@@ -143,51 +288,118 @@ If you cannot find a clear weakness, provide the closest possible counterpoint o
 
 The response should only be the JSON object, without any additional text or markdown.
 """
+        prompt_tokens = await loop.run_in_executor(self.search_pool, self._count_tokens, prompt)
+        print(f"📏 Analysis prompt: {prompt_tokens} tokens, {included}/{len(cases_data)} cases "
+              f"(case budget {ANALYSIS_TOKEN_BUDGET})")
         try:
-            response = self.gen_model.generate_content(prompt)
-            cleaned_response = response.text.strip().replace("```json", "").replace("```", "")
-            return json.loads(cleaned_response)
+            return await self._generate(prompt)
         except Exception as e:
             print(f"Error calling Gemini or parsing response: {e}")
             return {"strengths": [], "weaknesses": []}
 
-    def search_similar_cases(self, user_prompt: str, top_k: int = 10, claimant: str = None, respondent: str = None, case_year: int = None):
+    async def search_similar_cases(self, user_prompt: str, top_k: int = 10, claimant: str = None, respondent: str = None, case_year: int = None,
+                             filters: dict = None, metadata=None):
         """
         Search for similar cases using a two-stage process:
         1. Broad semantic search based on the user prompt.
         2. Rescore the top results based on metadata similarity.
+
+        ``filters`` restricts the search to matching chunks before any vector
+        is compared: ``year_from``/``year_to`` (decision year, inclusive) and
+        ``institution``, ``nationality``, ``treaty``, ``rules_of_arbitration``
+        (a term or list of terms, matched against the case fields).
+
+        ``metadata`` may be an awaitable (e.g. ``extract_metadata_from_prompt``)
+        resolving to claimant/respondent/case_year values for the fields left
+        unset; stage 1 runs while it is still pending.
         """
-        if self.collection.count() == 0:
-            return {"strengths": [], "weaknesses": []}
+        query = {"user_prompt": user_prompt, "claimant": claimant, "respondent": respondent,
+                 "case_year": case_year, "filters": filters, "metadata": metadata}
+        return (await self.search_similar_cases_batch([query], top_k))[0]
+
+    async def search_similar_cases_batch(self, queries: list, top_k: int = 10) -> list:
+        """
+        Run ``search_similar_cases`` for many queries at once.
+
+        Each query is a dict with ``user_prompt`` and optionally ``claimant``,
+        ``respondent``, ``case_year``, ``filters`` and ``metadata``. All
+        prompts are embedded in one batch, queries sharing the same filters go
+        to the index in one call, and the Gemini analyses run concurrently.
+        Returns one result per query, in order.
+        """
+        if not queries:
+            return []
+        loop = asyncio.get_running_loop()
 
-        # Stage 1: Broad semantic search
-        query_embedding = self._embed_text(user_prompt)
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=min(top_k * 10, self.collection.count())  # Fetch a large pool for rescoring
+        # Stage 1 does not need the metadata; only rescoring waits for both
+        pending = [asyncio.ensure_future(query["metadata"]) if query.get("metadata") else None for query in queries]
+        hits, *extracted = await asyncio.gather(
+            loop.run_in_executor(self.search_pool, self._search_chunks, queries, top_k),
+            *(future for future in pending if future is not None)
         )
-        
-        # === FIX ENCODING ISSUES AT THE SOURCE ===
-        # The data from ChromaDB might have encoding issues (mojibake).
-        # We fix it here before it's used anywhere else.
-        if results['documents'] and results['documents'][0]:
-            results['documents'][0] = [self._fix_mojibake(doc) for doc in results['documents'][0]]
-        
-        if results['metadatas'] and results['metadatas'][0]:
-            fixed_metadatas = []
-            for meta in results['metadatas'][0]:
-                fixed_meta = {}
-                for key, value in meta.items():
-                    if isinstance(value, str):
-                        fixed_meta[key] = self._fix_mojibake(value)
-                    elif isinstance(value, list):
-                        # Also fix strings within lists
-                        fixed_meta[key] = [self._fix_mojibake(item) if isinstance(item, str) else item for item in value]
-                    else:
-                        fixed_meta[key] = value
-                fixed_metadatas.append(fixed_meta)
-            results['metadatas'][0] = fixed_metadatas
-        
+        extracted = iter(extracted)
+        for query, future in zip(queries, pending):
+            if future is not None:
+                found = next(extracted) or {}
+                for field in ("claimant", "respondent", "case_year"):
+                    query[field] = query.get(field) or found.get(field)
+
+        selected = await loop.run_in_executor(self.search_pool, self._select_batch, hits, queries, top_k)
+        return list(await asyncio.gather(*(
+            self._analyze_cases(query["user_prompt"], cases) for query, cases in zip(queries, selected)
+        )))
+
+    def _search_chunks(self, queries: list, top_k: int) -> list:
+        """Stage 1: the candidate chunks of each query (None if its filters match nothing)."""
+        with self._refresh_lock:
+            self._refresh_shards()
+            self.index.refresh()
+            # Case-level filters are resolved to case keys via the inverted indexes
+            self._load_case_table()
+        chunk_count = self.index.count()
+        if chunk_count == 0:
+            return [None] * len(queries)
+
+        groups = {}
+        for i, query in enumerate(queries):
+            try:
+                where = build_where(query.get("filters"), self.case_terms)
+            except LookupError:
+                continue
+            groups.setdefault(json.dumps(where, sort_keys=True), (where, []))[1].append(i)
+
+        # Broad semantic search, one index query per distinct filter
+        query_embeddings = self._embed_texts([query["user_prompt"] for query in queries])
+        hits = [None] * len(queries)
+        for where, members in groups.values():
+            results = self.index.query(
+                query_embeddings=[query_embeddings[i] for i in members],
+                n_results=min(top_k * CANDIDATE_POOL_FACTOR, chunk_count),  # Fetch a large pool for rescoring
+                where=where
+            )
+            for row, i in enumerate(members):
+                hits[i] = {key: results[key][row] for key in ("documents", "metadatas", "distances")}
+        return hits
+
+    def _select_batch(self, hits: list, queries: list, top_k: int) -> list:
+        """Stage 2 and the case selection for each query."""
+        return [
+            self._select_cases(hit, top_k, query.get("claimant"), query.get("respondent"), query.get("case_year"))
+            if hit else []
+            for hit, query in zip(hits, queries)
+        ]
+
+    def _select_cases(self, hit: dict, top_k: int, claimant: str = None, respondent: str = None, case_year: int = None) -> list:
+        """Rescore one query's chunk hits and pick the cases handed to Gemini."""
+        # Chunks only carry a case key; pull the case-level fields back in
+        hit['metadatas'] = [self._join_case_metadata(meta) for meta in hit['metadatas']]
+
+        # Collections ingested before text was repaired at ingest time may
+        # hold mojibake; fix it here until database/repair_collection.py has run
+        if not self.text_repaired:
+            hit['documents'] = [fix_mojibake(doc) for doc in hit['documents']]
+            hit['metadatas'] = [repair_value(meta) for meta in hit['metadatas']]
+
         # Stage 2: Metadata Rescoring
         if claimant or respondent or case_year:
             # Create the query's metadata string
@@ -198,53 +410,56 @@ The response should only be the JSON object, without any additional text or mark
             query_meta_str = ". ".join(query_meta_parts)
             query_meta_embedding = self._embed_text(query_meta_str)
 
-            # Create metadata strings for each result
-            result_meta_strs = []
-            for meta in results['metadatas'][0]:
-                meta_parts = []
-                if meta.get("PartyNationalities"): meta_parts.append(f"Parties: {meta['PartyNationalities']}")
-                if meta.get("DecisionDate"): meta_parts.append(f"Date: {meta['DecisionDate']}")
-                result_meta_strs.append(". ".join(meta_parts))
+            # Metadata strings of the results were embedded at ingest time;
+            # the model only runs for strings the ingester has not seen
+            result_meta_strs = [rescoring_text(meta) for meta in hit['metadatas']]
+            result_meta_embeddings = self.embedding_cache.encode(result_meta_strs, self._encode_batch, store=False)
 
-            # Embed all result metadata strings at once for efficiency
-            result_meta_embeddings = self.model.encode(result_meta_strs)
-            
-            # Calculate cosine similarity between query metadata and result metadata
-            meta_similarities = cosine_similarity([query_meta_embedding], result_meta_embeddings)[0]
+            # All vectors are unit length, so cosine similarity is a dot product
+            meta_similarities = result_meta_embeddings @ np.asarray(query_meta_embedding, dtype=np.float32)
             
             # Combine semantic distance and metadata similarity into a new score
             # We convert semantic distance to similarity (1 - distance)
-            semantic_similarities = [1 - dist for dist in results['distances'][0]]
+            semantic_similarities = [1 - dist for dist in hit['distances']]
             
             # Weighted average: 70% semantic, 30% metadata. Tune as needed.
             combined_scores = (0.7 * np.array(semantic_similarities)) + (0.3 * np.array(meta_similarities))
             
-            # Get the indices of the top_k results based on the new combined score
-            top_indices = np.argsort(combined_scores)[::-1][:top_k]
-
         else:
-            # If no metadata is provided, just use the top semantic results
-            top_indices = list(range(top_k))
+            # If no metadata is provided, just use the semantic ranking
+            combined_scores = -np.asarray(hit['distances'], dtype=np.float64)
+
+        # Collapse to the best chunk(s) per case before cutting to top_k, so
+        # Gemini sees distinct cases and each file is read once
+        candidates = [i for i, meta in enumerate(hit['metadatas']) if meta.get("source_file")]
+        source_files = [hit['metadatas'][i]["source_file"] for i in candidates]
+        top_indices = [candidates[i] for i in collapse_by_case(np.asarray(combined_scores)[candidates], source_files, top_k)]
 
         # Build the final list of cases for Gemini
         cases_for_gemini = []
         for i in top_indices:
-            meta = results['metadatas'][0][i]
+            meta = hit['metadatas'][i]
             source_file = meta.get("source_file")
             if source_file:
                 full_case_data = self._read_case_file(source_file)
                 meta['full_case_data'] = full_case_data
                 cases_for_gemini.append({
-                    "document": results['documents'][0][i],
+                    "document": hit['documents'][i],
                     "metadata": meta,
-                    "distance": results['distances'][0][i] 
+                    "distance": hit['distances'][i] 
                 })
+        return cases_for_gemini
 
+    async def _analyze_cases(self, user_prompt: str, cases_for_gemini: list) -> dict:
+        """Have Gemini argue from the selected cases and resolve its case references."""
         if not cases_for_gemini:
             print("No cases for Gemini analysis found after rescoring.")
             return {"strengths": [], "weaknesses": []}
-        structured_analysis = self._analyze_with_gemini(user_prompt, cases_for_gemini)
-        case_lookup = {case['metadata']['source_file']: case for case in cases_for_gemini}
+        structured_analysis = await self._analyze_with_gemini(user_prompt, cases_for_gemini)
+        # A reference to a case cites its best-scoring chunk
+        case_lookup = {}
+        for case in cases_for_gemini:
+            case_lookup.setdefault(case['metadata']['source_file'], case)
         def process_arguments(arg_list):
             processed_list = []
             for arg in arg_list:
@@ -0,0 +1,109 @@
+import re
+from typing import Dict, Optional, Tuple
+
+_YEAR = re.compile(r"\b(19[5-9]\d|20\d\d)\b")
+# "A v. B", "A vs B", "A versus B" in a prompt
+_VERSUS = re.compile(r"([\w&'-]+(?:\s+[\w&'-]+){0,7})\s+(?:v\.|vs\.?|versus)\s+([\w&'-]+(?:\s+[\w&'-]+){0,7})",
+                     re.IGNORECASE)
+# Case titles name the parties as "<claimant> v. <respondent>"
+_TITLE_PARTIES = re.compile(r"^(.+?)\s+v\.?\s+(.+?)(?:\s*\(.*\))?$")
+_SUFFIX = re.compile(r",?\s+(?:and others|et al\.?)$", re.IGNORECASE)
+MAX_NAME_WORDS = 8
+# A side of "A v. B" not in the gazetteer is only taken as a name when this short
+MAX_UNKNOWN_NAME_WORDS = 4
+# Words that end a party name read off "A v. B" ("... v. Spain in 2016")
+_NAME_STOPWORDS = {"a", "about", "against", "an", "are", "as", "at", "by", "case", "cases", "cite", "concerning",
+                   "decided", "did", "does", "for", "from", "how", "in", "is", "like", "on", "regarding",
+                   "similar", "than", "to", "under", "was", "were", "what", "when", "where", "which", "who",
+                   "why", "with"}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.findall(r"[\w&'-]+", text.lower()))
+
+
+def _name_words(side: str, from_end: bool) -> str:
+    """The words of ``side`` next to the "v.", up to the first stop-word or number."""
+    words = side.split()
+    kept = []
+    for word in reversed(words) if from_end else words:
+        if word.lower() in _NAME_STOPWORDS or any(ch.isdigit() for ch in word):
+            break
+        kept.append(word)
+    return " ".join(reversed(kept) if from_end else kept)
+
+
+class PromptMetadataExtractor:
+    """Rule- and gazetteer-based claimant/respondent/year extraction.
+
+    The gazetteer holds the party names of the case titles in the corpus
+    (``<claimant> v. <respondent>``) and the party nationalities, each with
+    the role it most often plays. ``extract`` returns the fields it found
+    and whether they are complete enough to skip the LLM.
+    """
+
+    def __init__(self, case_metadata: Dict[str, dict]):
+        roles: Dict[str, Dict[str, int]] = {}
+
+        def add(name: str, role: str):
+            key = _normalize(_SUFFIX.sub("", name))
+            if key and len(key.split()) <= MAX_NAME_WORDS:
+                counts = roles.setdefault(key, {"claimant": 0, "respondent": 0, "name": _SUFFIX.sub("", name).strip()})
+                counts[role] += 1
+
+        for meta in case_metadata.values():
+            match = _TITLE_PARTIES.match(str(meta.get("Title") or "").strip())
+            if match:
+                add(match.group(1), "claimant")
+                add(match.group(2), "respondent")
+            for nationality in str(meta.get("PartyNationalities") or "").split(", "):
+                if nationality.strip():
+                    # States are the usual respondents in treaty arbitration
+                    add(nationality, "respondent")
+
+        self.names = {key: (counts["name"], "claimant" if counts["claimant"] > counts["respondent"] else "respondent")
+                      for key, counts in roles.items()}
+
+    def _gazetteer_hits(self, prompt: str):
+        """Known party names in ``prompt`` as ``(position, name, role)``, longest match first."""
+        words = _normalize(prompt).split()
+        hits, taken = [], set()
+        for size in range(min(MAX_NAME_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                span = set(range(start, start + size))
+                if span & taken:
+                    continue
+                entry = self.names.get(" ".join(words[start:start + size]))
+                if entry:
+                    hits.append((start, *entry))
+                    taken |= span
+        return sorted(hits)
+
+    def extract(self, prompt: str, known: Optional[dict] = None) -> Tuple[dict, bool]:
+        """``({"claimant", "respondent", "case_year"}, confident)`` for a prompt.
+
+        Non-empty values in ``known`` are kept as they are; only the empty
+        fields are filled from the prompt.
+        """
+        years = sorted(set(_YEAR.findall(prompt)))
+        found = {"claimant": None, "respondent": None, "case_year": int(years[0]) if len(years) == 1 else None}
+        found.update({field: value for field, value in (known or {}).items() if value})
+
+        versus = _VERSUS.search(prompt)
+        if versus:
+            for role, side in zip(("claimant", "respondent"), versus.groups()):
+                if found[role]:
+                    continue
+                hits = self._gazetteer_hits(side)
+                name = _name_words(side, from_end=role == "claimant")
+                if hits:
+                    # The known name closest to the "v."
+                    found[role] = hits[-1 if role == "claimant" else 0][1]
+                elif name and len(name.split()) <= MAX_UNKNOWN_NAME_WORDS:
+                    found[role] = name
+        for _, name, role in self._gazetteer_hits(prompt):
+            found[role] = found[role] or name
+
+        # Several years may be a range the model reads better; a missing year is just absent
+        confident = bool(found["claimant"] and found["respondent"]) and (len(years) <= 1 or bool(found["case_year"]))
+        return found, confident
@@ -0,0 +1,372 @@
+import os
+import json
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# === Configuration ===
+# "chroma" queries the HNSW index through Chroma; "numpy" does exact search in-process;
+# "numpy-int8" / "numpy-pca" search compressed vectors and rerank with the full ones
+VECTOR_INDEX = os.environ.get("VECTOR_INDEX", "chroma")
+# Memory-map the NumPy snapshot instead of reading it into RAM
+VECTOR_INDEX_MMAP = os.environ.get("VECTOR_INDEX_MMAP", "1") == "1"
+# Dimensions kept by the PCA first stage, and first-stage candidates per requested result
+PCA_DIMS = int(os.environ.get("VECTOR_INDEX_PCA_DIMS", "96"))
+RERANK_FACTOR = int(os.environ.get("VECTOR_INDEX_RERANK_FACTOR", "4"))
+GET_PAGE_SIZE = 5000
+COMPRESS_BLOCK_ROWS = 65536
+
+
+class ChromaIndex:
+    """Top-k search through ``collection.query`` (Chroma's HNSW index)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def refresh(self):
+        pass
+
+    def query(self, query_embeddings, n_results: int, where: Optional[dict] = None) -> dict:
+        if where:
+            return self.collection.query(query_embeddings=list(query_embeddings), n_results=n_results, where=where)
+        return self.collection.query(query_embeddings=list(query_embeddings), n_results=n_results)
+
+
+class _Snapshot:
+    """The loaded index data; refresh swaps in a new one, so queries never see a mix of two."""
+
+    def __init__(self, vectors: np.ndarray, ids: List[str], metadatas: List[dict]):
+        self.vectors = vectors
+        self.ids = ids
+        self.metadatas = metadatas
+        self.sq_norms = np.einsum("ij,ij->i", vectors, vectors) if len(ids) else np.zeros(0, dtype=np.float32)
+        # Filter structures, built on first use
+        self.postings = {}
+        self.sorted_columns = {}
+
+
+class NumpyIndex:
+    """Exact top-k search over all chunk vectors held in one float32 matrix.
+
+    The vectors, ids and metadata are pulled out of the collection once and
+    snapshotted under ``snapshot_dir`` (``vectors.npy`` + ``records.json``);
+    later starts load (or memory-map) the snapshot. Queries are a single
+    matrix product plus ``argpartition``; only the documents of the hits are
+    fetched from Chroma. Results have the same shape as ``collection.query``.
+
+    The snapshot is rebuilt when the ingest manifest (rewritten at the end of
+    every ingestion run) is newer than the snapshot or the chunk count differs.
+    A reload builds a new ``_Snapshot`` and swaps it in with one assignment;
+    a query reads ``self.state`` once, so it may run on another thread
+    while the index refreshes.
+
+    ``where`` filters support the subset of Chroma's syntax the service uses
+    (``$and``, ``$eq``, ``$in``, ``$gte``, ``$lte``). They are answered from
+    per-field postings and sorted columns built on first use, and distances
+    are only computed for the matching rows.
+    """
+
+    def __init__(self, collection, snapshot_dir: str, manifest_path: str, mmap: bool = VECTOR_INDEX_MMAP):
+        self.collection = collection
+        self.snapshot_dir = snapshot_dir
+        self.manifest_path = manifest_path
+        self.mmap = mmap
+        self.space = (collection.metadata or {}).get("hnsw:space", "l2")
+        self.state = _Snapshot(np.zeros((0, 0), dtype=np.float32), [], [])
+        self._manifest_mtime = None
+        self._loaded = False
+        self.refresh()
+
+    def count(self) -> int:
+        return len(self.state.ids)
+
+    def _vectors_path(self) -> str:
+        return os.path.join(self.snapshot_dir, "vectors.npy")
+
+    def _records_path(self) -> str:
+        return os.path.join(self.snapshot_dir, "records.json")
+
+    def refresh(self):
+        """Load the snapshot, rebuilding it first if the collection has changed since."""
+        try:
+            manifest_mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            manifest_mtime = None
+        if self._loaded and manifest_mtime == self._manifest_mtime:
+            return
+
+        state = self._load_snapshot(manifest_mtime)
+        if state is None:
+            self._build_snapshot(manifest_mtime)
+            state = self._load_snapshot(manifest_mtime)
+        self.state = state
+        self._manifest_mtime = manifest_mtime
+        self._loaded = True
+
+    def _load_snapshot(self, manifest_mtime: Optional[float]) -> Optional[_Snapshot]:
+        try:
+            with open(self._records_path(), "r", encoding="utf-8") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if records.get("manifest_mtime") != manifest_mtime or len(records["ids"]) != self.collection.count():
+            return None
+        vectors = np.load(self._vectors_path(), mmap_mode="r" if self.mmap else None)
+        return _Snapshot(vectors, records["ids"], records["metadatas"])
+
+    def _build_snapshot(self, manifest_mtime: Optional[float]):
+        print("🔄 Building NumPy vector index from the Chroma collection...")
+        ids, metadatas, blocks = [], [], []
+        total = self.collection.count()
+        for offset in range(0, total, GET_PAGE_SIZE):
+            page = self.collection.get(limit=GET_PAGE_SIZE, offset=offset, include=["embeddings", "metadatas"])
+            ids.extend(page["ids"])
+            metadatas.extend(page["metadatas"])
+            blocks.append(np.asarray(page["embeddings"], dtype=np.float32))
+        vectors = np.concatenate(blocks) if blocks else np.zeros((0, 0), dtype=np.float32)
+        if self.space != "l2" and len(vectors):
+            # Cosine/ip distances are computed on unit vectors
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        # Write beside and swap in, so a live memory map of the old file stays valid
+        tmp_vectors = self._vectors_path() + ".tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors))
+        os.replace(tmp_vectors, self._vectors_path())
+        tmp_path = self._records_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"manifest_mtime": manifest_mtime, "ids": ids, "metadatas": metadatas}, f)
+        os.replace(tmp_path, self._records_path())
+        print(f"✅ NumPy vector index holds {len(ids)} chunks")
+
+    def _field_postings(self, state: _Snapshot, field: str) -> Dict:
+        """Inverted index of one metadata field: value -> sorted row numbers."""
+        if field not in state.postings:
+            postings = {}
+            for row, meta in enumerate(state.metadatas):
+                if field in meta:
+                    postings.setdefault(meta[field], []).append(row)
+            state.postings[field] = {value: np.asarray(rows, dtype=np.int64) for value, rows in postings.items()}
+        return state.postings[field]
+
+    def _sorted_column(self, state: _Snapshot, field: str):
+        """``(values, rows)`` of a numeric field, sorted by value, for range lookups."""
+        if field not in state.sorted_columns:
+            rows = np.asarray([row for row, meta in enumerate(state.metadatas)
+                               if isinstance(meta.get(field), (int, float))], dtype=np.int64)
+            values = np.asarray([state.metadatas[row][field] for row in rows], dtype=np.float64)
+            order = np.argsort(values, kind="stable")
+            state.sorted_columns[field] = (values[order], rows[order])
+        return state.sorted_columns[field]
+
+    def _matching_rows(self, state: _Snapshot, where: dict) -> np.ndarray:
+        """Sorted row numbers whose metadata satisfies ``where``."""
+        if "$and" in where:
+            rows = None
+            for clause in where["$and"]:
+                matched = self._matching_rows(state, clause)
+                rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            return rows if rows is not None else np.arange(len(state.ids))
+        if len(where) != 1:
+            return self._matching_rows(state, {"$and": [{k: v} for k, v in where.items()]})
+
+        (field, condition), = where.items()
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if len(condition) != 1:
+            return self._matching_rows(state, {"$and": [{field: {op: v}} for op, v in condition.items()]})
+        (op, value), = condition.items()
+        if op in ("$eq", "$in"):
+            postings = self._field_postings(state, field)
+            hits = [postings[v] for v in (value if op == "$in" else [value]) if v in postings]
+            return np.unique(np.concatenate(hits)) if hits else np.zeros(0, dtype=np.int64)
+        if op in ("$gte", "$lte"):
+            values, rows = self._sorted_column(state, field)
+            if op == "$gte":
+                return np.sort(rows[np.searchsorted(values, value, side="left"):])
+            return np.sort(rows[:np.searchsorted(values, value, side="right")])
+        raise ValueError(f"Unsupported where operator {op!r} in the NumPy index")
+
+    def _distances(self, state: _Snapshot, queries: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Distances in the collection's space, so scores match what Chroma returns."""
+        vectors = state.vectors if rows is None else state.vectors[rows]
+        sq_norms = state.sq_norms if rows is None else state.sq_norms[rows]
+        dots = queries @ vectors.T
+        if self.space == "l2":
+            # Squared L2, like hnswlib
+            return np.sum(queries ** 2, axis=1)[:, None] - 2 * dots + sq_norms[None, :]
+        if self.space == "cosine":
+            queries_norm = np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+            return 1 - dots / queries_norm
+        return 1 - dots
+
+    def _top(self, state: _Snapshot, queries: np.ndarray, rows: Optional[np.ndarray], n_results: int):
+        """Index rows and distances of the ``n_results`` nearest rows per query, nearest first."""
+        distances = self._distances(state, queries, rows)
+        top = np.argpartition(distances, n_results - 1, axis=1)[:, :n_results]
+        query_rows = np.arange(len(queries))[:, None]
+        top = np.take_along_axis(top, np.argsort(distances[query_rows, top], axis=1), axis=1)
+        top_distances = distances[query_rows, top]
+        if rows is not None:
+            # Positions within the filtered matrix back to index rows
+            top = rows[top]
+        return top, top_distances
+
+    def resident_bytes(self) -> int:
+        """Bytes of vector data held in RAM (a memory-mapped matrix is paged in on demand)."""
+        state = self.state
+        vectors = 0 if isinstance(state.vectors, np.memmap) else state.vectors.nbytes
+        return vectors + state.sq_norms.nbytes
+
+    def query(self, query_embeddings, n_results: int, where: Optional[dict] = None) -> dict:
+        state = self.state
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        rows = self._matching_rows(state, where) if where else None
+        n_results = min(n_results, len(state.ids) if rows is None else len(rows))
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if n_results == 0:
+            for key in results:
+                results[key] = [[] for _ in queries]
+            return results
+
+        top, top_distances = self._top(state, queries, rows, n_results)
+
+        # One round trip for the documents of every hit in the batch
+        hit_ids = list(dict.fromkeys(state.ids[i] for i in top.ravel()))
+        fetched = self.collection.get(ids=hit_ids, include=["documents"])
+        documents = dict(zip(fetched["ids"], fetched["documents"]))
+
+        for q, indices in enumerate(top):
+            results["ids"].append([state.ids[i] for i in indices])
+            results["documents"].append([documents.get(state.ids[i]) for i in indices])
+            results["metadatas"].append([dict(state.metadatas[i]) for i in indices])
+            results["distances"].append(top_distances[q].tolist())
+        return results
+
+
+class CompressedIndex(NumpyIndex):
+    """Two-stage search: a compressed copy of the vectors in RAM, full vectors for the rerank.
+
+    ``compression`` is ``int8`` (per-dimension scalar quantization, 4x
+    smaller) or ``pca`` (projection onto the top ``pca_dims`` principal
+    components). The first stage scores every (matching) row on the
+    compressed vectors and keeps ``rerank_factor * n_results`` candidates;
+    only those are re-scored with the full-precision vectors, which stay
+    memory-mapped on disk. Returned distances are exact.
+
+    The compressed vectors and their codebook are part of the snapshot, so
+    they are swapped in together with the vectors they were built from.
+    """
+
+    def __init__(self, collection, snapshot_dir: str, manifest_path: str, compression: str = "int8",
+                 pca_dims: int = PCA_DIMS, rerank_factor: int = RERANK_FACTOR):
+        if compression not in ("int8", "pca"):
+            raise ValueError(f"Unknown compression {compression!r}, expected 'int8' or 'pca'")
+        self.compression = compression
+        self.pca_dims = pca_dims
+        self.rerank_factor = rerank_factor
+        super().__init__(collection, snapshot_dir, manifest_path, mmap=True)
+
+    def _load_snapshot(self, manifest_mtime: Optional[float]) -> Optional[_Snapshot]:
+        state = super()._load_snapshot(manifest_mtime)
+        if state is not None:
+            self._compress(state)
+        return state
+
+    def _compress(self, state: _Snapshot):
+        n, dim = state.vectors.shape
+        if self.compression == "int8":
+            scale = np.zeros(dim, dtype=np.float32)
+            for start in range(0, n, COMPRESS_BLOCK_ROWS):
+                scale = np.maximum(scale, np.abs(state.vectors[start:start + COMPRESS_BLOCK_ROWS]).max(axis=0))
+            state.scale = np.clip(scale, 1e-12, None) / 127
+            state.codes = np.empty((n, dim), dtype=np.int8)
+        else:
+            # Principal axes from the covariance, accumulated block by block
+            mean = np.zeros(dim, dtype=np.float64)
+            cov = np.zeros((dim, dim), dtype=np.float64)
+            for start in range(0, n, COMPRESS_BLOCK_ROWS):
+                block = np.asarray(state.vectors[start:start + COMPRESS_BLOCK_ROWS], dtype=np.float64)
+                mean += block.sum(axis=0)
+                cov += block.T @ block
+            mean /= max(n, 1)
+            cov = cov / max(n, 1) - np.outer(mean, mean)
+            _, eigenvectors = np.linalg.eigh(cov)
+            state.components = np.ascontiguousarray(eigenvectors[:, ::-1][:, :self.pca_dims], dtype=np.float32)
+            state.mean = mean.astype(np.float32)
+            state.codes = np.empty((n, state.components.shape[1]), dtype=np.float32)
+
+        # Norms of the approximated vectors, for approximate L2
+        state.code_sq_norms = np.empty(n, dtype=np.float32)
+        for start in range(0, n, COMPRESS_BLOCK_ROWS):
+            block = np.asarray(state.vectors[start:start + COMPRESS_BLOCK_ROWS], dtype=np.float32)
+            codes = self._encode(state, block)
+            state.codes[start:start + len(block)] = codes
+            approx = self._decode(state, codes)
+            state.code_sq_norms[start:start + len(block)] = np.einsum("ij,ij->i", approx, approx)
+
+    def _encode(self, state: _Snapshot, vectors: np.ndarray) -> np.ndarray:
+        if self.compression == "int8":
+            return np.clip(np.rint(vectors / state.scale), -127, 127).astype(np.int8)
+        return (vectors - state.mean) @ state.components
+
+    def _decode(self, state: _Snapshot, codes: np.ndarray) -> np.ndarray:
+        if self.compression == "int8":
+            return codes.astype(np.float32) * state.scale
+        return codes @ state.components.T + state.mean
+
+    def _approx_distances(self, state: _Snapshot, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """First-stage distances on the compressed vectors, computed block by block."""
+        if self.compression == "int8":
+            # q . (codes * scale) == (q * scale) . codes
+            projected, offsets = queries * state.scale, np.zeros(len(queries), dtype=np.float32)
+        else:
+            # q . (codes @ C.T + mean) == (q @ C) . codes + q . mean
+            projected, offsets = queries @ state.components, queries @ state.mean
+        rows = np.arange(len(state.ids)) if rows is None else rows
+        dots = np.empty((len(queries), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), COMPRESS_BLOCK_ROWS):
+            block = rows[start:start + COMPRESS_BLOCK_ROWS]
+            dots[:, start:start + len(block)] = projected @ state.codes[block].astype(np.float32).T
+        dots += offsets[:, None]
+        if self.space == "l2":
+            return np.sum(queries ** 2, axis=1)[:, None] - 2 * dots + state.code_sq_norms[rows][None, :]
+        if self.space == "cosine":
+            return 1 - dots / np.clip(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12, None)
+        return 1 - dots
+
+    def _top(self, state: _Snapshot, queries: np.ndarray, rows: Optional[np.ndarray], n_results: int):
+        candidates = len(state.ids) if rows is None else len(rows)
+        pool = min(candidates, n_results * self.rerank_factor)
+        approx = self._approx_distances(state, queries, rows)
+        shortlist = np.argpartition(approx, pool - 1, axis=1)[:, :pool]
+        if rows is not None:
+            shortlist = rows[shortlist]
+
+        # Rerank each query's shortlist with the full vectors
+        tops, top_distances = [], []
+        for query, candidate_rows in zip(queries, shortlist):
+            candidate_rows = np.sort(candidate_rows)  # sequential reads from the memory map
+            top, distances = super()._top(state, query[None, :], candidate_rows, n_results)
+            tops.append(top[0])
+            top_distances.append(distances[0])
+        return np.asarray(tops), np.asarray(top_distances)
+
+    def resident_bytes(self) -> int:
+        state = self.state
+        return state.codes.nbytes + state.sq_norms.nbytes + state.code_sq_norms.nbytes
+
+
+def make_vector_index(collection, kind: str = VECTOR_INDEX, snapshot_dir: str = None, manifest_path: str = None):
+    """Return the index backend selected by ``kind`` ("chroma", "numpy", "numpy-int8" or "numpy-pca")."""
+    if kind == "chroma":
+        return ChromaIndex(collection)
+    if kind == "numpy":
+        return NumpyIndex(collection, snapshot_dir, manifest_path)
+    if kind in ("numpy-int8", "numpy-pca"):
+        return CompressedIndex(collection, snapshot_dir, manifest_path, kind.split("-", 1)[1])
+    raise ValueError(f"Unknown vector index {kind!r}, expected 'chroma', 'numpy', 'numpy-int8' or 'numpy-pca'")